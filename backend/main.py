@@ -1,25 +1,53 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Query
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel, EmailStr
 from typing import Optional, List
 import os
 from dotenv import load_dotenv
 import openai
 import json
+import hashlib
+import hmac
+from contextlib import asynccontextmanager
+import asyncio
+import logging
 from datetime import datetime, timedelta
 from services.openai_service import OpenAIService
 from services.reminder_service import ReminderService
 from services.study_guide_generator import StudyGuideGenerator
-from models.study_models import StudyRequest, StudyResponse, ReminderRequest
+from services.compact_format import COMPACT_MEDIA_TYPE, wants_compact, to_compact
+from services.plan_store import PlanStore
+from services.bulk_scheduler import BulkScheduler
+from services.admission_control import AdmissionController, AdmissionRejected
+from services.deadline import Deadline
+from services.idempotency import IdempotencyStore, IdempotencyConflict
+from services.generation_tasks import generate_study_plan, generation_jobs
+from services.tracing import configure_logging, start_span
+from services.compression import CompressionMiddleware, etag_matches
+from services.plan_export import EXPORT_FORMATS, EXPORT_SECTIONS, ExportCache, render_export
+from models.study_models import StudyRequest, StudyResponse, ReminderRequest, BulkReplanRequest, TopicRefineRequest
 
 load_dotenv()
 
+configure_logging()
+logger = logging.getLogger(__name__)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Open pooled connections to OpenAI in the background so startup isn't held up
+    warm_up = asyncio.ensure_future(openai_service.warm_up())
+    yield
+    warm_up.cancel()
+    await openai_service.close()
+
 app = FastAPI(
     title="Study Guide Generator API",
     description="AI-powered study guide and timetable generator",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS middleware
@@ -31,10 +59,32 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress larger API payloads (br/gzip)
+app.add_middleware(CompressionMiddleware)
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """Wrap each request in a span, continuing the caller's trace if it sent a traceparent."""
+    with start_span(
+        f"{request.method} {request.url.path}",
+        traceparent=request.headers.get("traceparent"),
+        http_method=request.method,
+        http_path=request.url.path
+    ) as span:
+        response = await call_next(request)
+        span.set_attribute("http_status", response.status_code)
+        response.headers["traceparent"] = span.traceparent
+        return response
+
 # Initialize services
 openai_service = OpenAIService()
 reminder_service = ReminderService()
 study_guide_generator = StudyGuideGenerator(openai_service)
+bulk_scheduler = BulkScheduler(study_guide_generator)
+plan_store = PlanStore()
+admission_controller = AdmissionController()
+idempotency_store = IdempotencyStore()
+export_cache = ExportCache()
 
 # Serve static files (frontend) - check multiple possible paths
 static_paths = ["../dist", "dist", "/app/static", "static"]
@@ -59,9 +109,76 @@ async def root():
         return FileResponse(index_file)
     return {"message": "Study Guide Generator API", "status": "running"}
 
+def _client_id(http_request: Request) -> str:
+    """Identify the calling client for usage accounting."""
+    return http_request.headers.get("x-client-id") or (http_request.client.host if http_request.client else "unknown")
+
+def _require_admin(http_request: Request):
+    """Allow admin endpoints only with the configured ADMIN_TOKEN."""
+    admin_token = os.getenv("ADMIN_TOKEN")
+    if not admin_token:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled")
+    # Constant-time comparison so response timing doesn't leak the token
+    supplied = http_request.headers.get("authorization", "").encode()
+    if not hmac.compare_digest(supplied, f"Bearer {admin_token}".encode()):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+def _session_owner(http_request: Request) -> Optional[str]:
+    """Owner key for plans from the caller's X-Session-Id (a random per-browser secret), if sent."""
+    session_id = http_request.headers.get("x-session-id")
+    if not session_id or len(session_id) > 255:
+        return None
+    return hashlib.sha256(session_id.encode("utf-8")).hexdigest()
+
+def _public_plan(plan: StudyResponse) -> StudyResponse:
+    """A stored plan as served by ID, without the requester's email address."""
+    return plan.model_copy(update={"email": None})
+
+async def _generate_plan(request: StudyRequest, deadline: Deadline,
+                         owner: Optional[str] = None) -> StudyResponse:
+    """Generate, validate and store a plan, then set up its reminders."""
+    # Generate study guide, shedding load once the service is saturated. Full
+    # generations always take the normal lane; the server alone decides what is cheap.
+    async with admission_controller.admit(cheap=False, max_wait=deadline.remaining()):
+        result = await study_guide_generator.generate_complete_plan(request, deadline=deadline)
+    
+    # Validate output has at least 5 topics
+    if len(result.topics) < 5:
+        raise HTTPException(
+            status_code=422, 
+            detail="Generated study guide should have at least 5 topics"
+        )
+    
+    # Validate timetable doesn't exceed daily hours
+    for day in result.timetable:
+        daily_hours = sum(session.duration for session in day.sessions)
+        if daily_hours > request.hoursPerDay:
+            raise HTTPException(
+                status_code=422,
+                detail="Generated timetable exceeds daily study hours limit"
+            )
+    
+    plan_store.save(result, owner)
+    
+    # Setup reminders if email provided
+    if request.email:
+        try:
+            await reminder_service.setup_reminders(request.email, result)
+        except Exception as e:
+            # Don't fail the whole request if reminders fail
+            logger.warning("Failed to setup reminders: %s", e)
+    
+    return result
+
 @app.post("/api/study-guide/generate", response_model=StudyResponse)
-async def generate_study_guide(request: StudyRequest):
+async def generate_study_guide(
+    request: StudyRequest,
+    http_request: Request,
+    response: Response,
+    format: Optional[str] = Query(None, description="Set to 'compact' for the compact wire format")
+):
     """Generate a comprehensive study guide and timetable."""
+    deadline = Deadline.from_header(http_request.headers.get("x-request-timeout"))
     try:
         # Validate input
         if not request.subject.strip():
@@ -73,41 +190,117 @@ async def generate_study_guide(request: StudyRequest):
         if request.hoursPerDay > 12:
             raise HTTPException(status_code=400, detail="Hours per day cannot exceed 12")
         
-        # Generate study guide
-        result = await study_guide_generator.generate_complete_plan(request)
-        
-        # Validate output has at least 5 topics
-        if len(result.topics) < 5:
-            raise HTTPException(
-                status_code=422, 
-                detail="Generated study guide should have at least 5 topics"
-            )
-        
-        # Validate timetable doesn't exceed daily hours
-        for day in result.timetable:
-            daily_hours = sum(session.duration for session in day.sessions)
-            if daily_hours > request.hoursPerDay:
-                raise HTTPException(
-                    status_code=422,
-                    detail="Generated timetable exceeds daily study hours limit"
+        idempotency_key = http_request.headers.get("idempotency-key")
+        replayed = False
+        with openai_service.usage_tracker.track_request(request.subject, _client_id(http_request)) as usage:
+            if idempotency_key:
+                if len(idempotency_key) > 255:
+                    raise HTTPException(status_code=400, detail="Idempotency-Key must be at most 255 characters")
+                fingerprint = hashlib.sha256(request.model_dump_json().encode("utf-8")).hexdigest()
+                result, replayed = await idempotency_store.run(
+                    idempotency_key,
+                    fingerprint,
+                    lambda: _generate_plan(request, deadline, _session_owner(http_request))
                 )
+            else:
+                result = await _generate_plan(request, deadline, _session_owner(http_request))
         
-        # Setup reminders if email provided
-        if request.email:
-            try:
-                await reminder_service.setup_reminders(request.email, result)
-            except Exception as e:
-                # Don't fail the whole request if reminders fail
-                print(f"Failed to setup reminders: {e}")
+        headers = {"Vary": "Accept"}
+        if replayed:
+            headers["Idempotent-Replayed"] = "true"
+        else:
+            headers["X-Token-Usage"] = usage.header_value()
         
+        if wants_compact(http_request.headers.get("accept"), format):
+            compact = to_compact(result)
+            if compact is not None:
+                return JSONResponse(content=compact, media_type=COMPACT_MEDIA_TYPE, headers=headers)
+        
+        response.headers.update(headers)
         return result
         
     except HTTPException:
         raise
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=503,
+            detail="Server is busy, please retry shortly",
+            headers={"Retry-After": str(e.retry_after)}
+        )
     except Exception as e:
-        print(f"Error generating study guide: {e}")
+        logger.exception("Error generating study guide: %s", e)
         raise HTTPException(status_code=500, detail="Failed to generate study guide")
 
+JOB_STATUSES = {
+    "PENDING": "queued",
+    "RECEIVED": "queued",
+    "STARTED": "running",
+    "PROGRESS": "running",
+    "RETRY": "running",
+    "SUCCESS": "succeeded",
+    "FAILURE": "failed",
+    "REVOKED": "failed",
+}
+
+@app.post("/api/study-guide/jobs", status_code=202)
+async def create_generation_job(request: StudyRequest, http_request: Request):
+    """Queue plan generation on the worker pool and return a job ID immediately."""
+    try:
+        task = await run_in_threadpool(generate_study_plan.apply_async,
+                                       args=[request.model_dump(mode="json"), _client_id(http_request)])
+        await run_in_threadpool(generation_jobs.record, task.id)
+    except Exception as e:
+        logger.exception("Error queueing generation job: %s", e)
+        raise HTTPException(status_code=503, detail="Generation queue unavailable")
+    
+    return {
+        "jobId": task.id,
+        "status": "queued",
+        "statusUrl": f"/api/study-guide/jobs/{task.id}"
+    }
+
+@app.get("/api/study-guide/jobs/{job_id}")
+async def get_generation_job(job_id: str, http_request: Request,
+                             wait: float = Query(0, ge=0, le=30, description="Seconds to long-poll for completion")):
+    """Report a job's progress, long-polling up to `wait` seconds for it to finish."""
+    stored = plan_store.get(job_id)
+    if stored is not None:
+        return {"jobId": job_id, "status": "succeeded", "result": _public_plan(stored.plan)}
+    
+    # Celery reports unknown IDs as PENDING, so only poll jobs we queued
+    try:
+        known = await run_in_threadpool(generation_jobs.exists, job_id)
+    except Exception as e:
+        logger.exception("Error looking up generation job: %s", e)
+        raise HTTPException(status_code=503, detail="Generation queue unavailable")
+    if not known:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    
+    task = generate_study_plan.AsyncResult(job_id)
+    waited = 0.0
+    while True:
+        state, info = await run_in_threadpool(lambda: (task.state, task.info))
+        if state in ("SUCCESS", "FAILURE", "REVOKED") or waited >= wait:
+            break
+        await asyncio.sleep(0.5)
+        waited += 0.5
+    
+    job = {"jobId": job_id, "status": JOB_STATUSES.get(state, "running")}
+    if state == "PROGRESS":
+        job["stage"] = (info or {}).get("stage")
+    elif state == "SUCCESS":
+        # Jobs are stored under their job ID so exports and later polls skip Redis
+        plan = StudyResponse(**info["plan"])
+        # Count the worker's tokens once, when the finished plan is first stored
+        if plan_store.get(job_id) is None:
+            openai_service.usage_tracker.merge(plan.subject, info["client"], info["usage"])
+        job["result"] = _public_plan(plan_store.put(job_id, plan, _session_owner(http_request)).plan)
+    elif state in ("FAILURE", "REVOKED"):
+        job["error"] = "Failed to generate study guide"
+    return job
+
 @app.post("/api/reminders/setup")
 async def setup_reminders(request: ReminderRequest):
     """Setup daily study reminders."""
@@ -115,14 +308,184 @@ async def setup_reminders(request: ReminderRequest):
         result = await reminder_service.setup_reminders(request.email, request)
         return {"message": "Reminders setup successfully", "reminder_id": result}
     except Exception as e:
-        print(f"Error setting up reminders: {e}")
+        logger.exception("Error setting up reminders: %s", e)
         raise HTTPException(status_code=500, detail="Failed to setup reminders")
 
+@app.post("/api/study-guide/bulk-replan")
+async def bulk_replan(request: BulkReplanRequest, http_request: Request):
+    """Re-schedule many stored plans at once, e.g. after a calendar change (admin only)."""
+    _require_admin(http_request)
+    stored_plans = []
+    missing = []
+    for plan_id in request.planIds:
+        stored = plan_store.get(plan_id)
+        if stored is None:
+            missing.append(plan_id)
+        else:
+            stored_plans.append(stored)
+    
+    # Scheduling thousands of plans is CPU-bound; keep it off the event loop
+    replanned = await run_in_threadpool(
+        bulk_scheduler.replan,
+        [stored.plan for stored in stored_plans],
+        hours_per_day=request.hoursPerDay,
+        total_days=request.totalDays
+    )
+    for stored, plan in zip(stored_plans, replanned):
+        plan_store.put(stored.plan_id, plan)
+    
+    return {
+        "replanned": [stored.plan_id for stored in stored_plans],
+        "missing": missing
+    }
+
+@app.post("/api/study-guide/plans/{plan_id}/topics/{topic_index}", response_model=StudyResponse)
+async def refine_topic(
+    plan_id: str,
+    topic_index: int,
+    request: TopicRefineRequest,
+    http_request: Request,
+    response: Response,
+    format: Optional[str] = Query(None, description="Set to 'compact' for the compact wire format")
+):
+    """Expand or replace a single topic of a stored plan and reschedule only the affected days."""
+    stored = plan_store.get(plan_id)
+    if stored is None:
+        raise HTTPException(status_code=404, detail="Study plan not found")
+    if not 0 <= topic_index < len(stored.plan.topics):
+        raise HTTPException(status_code=404, detail="Topic not found")
+    
+    deadline = Deadline.from_header(http_request.headers.get("x-request-timeout"))
+    try:
+        with openai_service.usage_tracker.track_request(stored.plan.subject, _client_id(http_request)) as usage:
+            # A single-topic prompt is a small request, so it gets the cheap lane
+            async with admission_controller.admit(cheap=True, max_wait=deadline.remaining()):
+                result, affected_days = await study_guide_generator.refine_topic(
+                    stored.plan, topic_index, request.action, deadline=deadline
+                )
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=503,
+            detail="Server is busy, please retry shortly",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except Exception as e:
+        logger.warning("Error refining topic %s of plan %s: %s", topic_index, plan_id, e)
+        raise HTTPException(status_code=502, detail=f"Could not {request.action} the topic, please retry")
+    
+    plan_store.put(plan_id, result)
+    result = _public_plan(result)
+    
+    headers = {
+        "Vary": "Accept",
+        "X-Token-Usage": usage.header_value(),
+        "X-Affected-Days": ",".join(str(day_index + 1) for day_index in affected_days)
+    }
+    if wants_compact(http_request.headers.get("accept"), format):
+        compact = to_compact(result)
+        if compact is not None:
+            return JSONResponse(content=compact, media_type=COMPACT_MEDIA_TYPE, headers=headers)
+    
+    response.headers.update(headers)
+    return result
+
+@app.api_route("/api/study-guide/plans/{plan_id}/export/{export_format}", methods=["GET", "HEAD"])
+async def export_study_plan(plan_id: str, export_format: str, http_request: Request, sections: str = "both"):
+    """Export a stored plan as an ICS calendar, Markdown or PDF (HEAD checks it is still stored)."""
+    if export_format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=404, detail="Unsupported export format")
+    if sections not in EXPORT_SECTIONS:
+        raise HTTPException(status_code=400, detail="Sections must be guide, timetable or both")
+    
+    stored = plan_store.get(plan_id)
+    if stored is None:
+        raise HTTPException(status_code=404, detail="Study plan not found")
+    
+    if export_format == "ics":
+        sections = "timetable"
+    media_type, extension = EXPORT_FORMATS[export_format]
+    etag = f'"{stored.content_hash}-{export_format}-{sections}"'
+    # Headers are latin-1, so keep the filename to ASCII ("数学" has nothing left to keep)
+    subject = "".join(c if c.isascii() and c.isalnum() else "_" for c in stored.plan.subject).strip("_").lower()
+    filename = f"{subject}_study_plan" if subject else "study_plan"
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "private, no-cache",
+        "Content-Disposition": f'attachment; filename="{filename}.{extension}"'
+    }
+    
+    if etag_matches(http_request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    if http_request.method == "HEAD":
+        return Response(status_code=200, media_type=media_type, headers=headers)
+    
+    cache_key = (stored.content_hash, export_format, sections)
+    content = export_cache.get(cache_key)
+    if content is not None:
+        return Response(content=content, media_type=media_type, headers=headers)
+    
+    chunks = render_export(stored.plan, stored.content_hash, export_format, sections)
+    return StreamingResponse(export_cache.stream(cache_key, chunks), media_type=media_type, headers=headers)
+
+@app.get("/api/study-guide/plans/{plan_id}", response_model=StudyResponse)
+async def get_study_plan(
+    plan_id: str,
+    http_request: Request,
+    format: Optional[str] = Query(None, description="Set to 'compact' for the compact wire format")
+):
+    """Get a stored plan; unchanged plans are revalidated with If-None-Match."""
+    stored = plan_store.get(plan_id)
+    if stored is None:
+        raise HTTPException(status_code=404, detail="Study plan not found")
+    
+    compact = wants_compact(http_request.headers.get("accept"), format)
+    etag = f'"{stored.content_hash}-compact"' if compact else f'"{stored.content_hash}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache", "Vary": "Accept"}
+    if etag_matches(http_request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    
+    plan = _public_plan(stored.plan)
+    if compact:
+        content = to_compact(plan)
+        if content is not None:
+            return JSONResponse(content=content, media_type=COMPACT_MEDIA_TYPE, headers=headers)
+    return JSONResponse(content=plan.model_dump(mode="json"), headers=headers)
+
 @app.get("/api/study-guide/history")
-async def get_study_history():
-    """Get study guide generation history."""
+async def get_study_history(http_request: Request):
+    """Get the caller's study guide history (by X-Session-Id), most recently used first."""
+    owner = _session_owner(http_request)
     # In a real app, this would fetch from a database
-    return {"history": []}
+    stored_plans = plan_store.list(owner) if owner else []
+    digest = hashlib.sha256(
+        "|".join(f"{stored.plan_id}:{stored.content_hash}" for stored in stored_plans).encode("utf-8")
+    ).hexdigest()
+    etag = f'"history-{digest}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache", "Vary": "X-Session-Id"}
+    if etag_matches(http_request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    
+    history = [
+        {
+            "planId": stored.plan_id,
+            "subject": stored.plan.subject,
+            "hoursPerDay": stored.plan.hoursPerDay,
+            "totalDays": stored.plan.totalDays,
+            "topicCount": len(stored.plan.topics),
+            "generatedAt": stored.plan.generatedAt.isoformat()
+        }
+        for stored in stored_plans
+    ]
+    return JSONResponse(content={"history": history}, headers=headers)
+
+@app.get("/api/admin/usage")
+async def get_token_usage(http_request: Request):
+    """Token usage per stage, subject and client, plus prompt variant selection stats."""
+    _require_admin(http_request)
+    return {
+        **openai_service.usage_tracker.snapshot(),
+        "prompt_variants": openai_service.prompt_selector.snapshot()
+    }
 
 @app.get("/health")
 async def health_check():
@@ -131,6 +494,8 @@ async def health_check():
         "status": "healthy",
         "timestamp": datetime.now().isoformat(),
         "openai_configured": bool(os.getenv("OPENAI_API_KEY")),
+        "admission": admission_controller.stats(),
+        "openai_pool": openai_service.pool_stats(),
         "static_dir": static_dir,
         "index_file": index_file
     }
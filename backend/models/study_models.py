@@ -44,6 +44,15 @@ class StudyResponse(BaseModel):
     timetable: List[DayPlan]
     email: Optional[str] = None
     generatedAt: datetime = Field(default_factory=datetime.now)
+    planId: Optional[str] = None
+
+class BulkReplanRequest(BaseModel):
+    planIds: List[str] = Field(..., min_length=1)
+    hoursPerDay: Optional[float] = Field(default=None, gt=0, le=12)
+    totalDays: Optional[int] = Field(default=None, ge=1, le=30)
+
+class TopicRefineRequest(BaseModel):
+    action: Literal['expand', 'replace']
 
 class ReminderRequest(BaseModel):
     email: EmailStr
@@ -0,0 +1,150 @@
+import os
+import math
+import time
+import heapq
+import asyncio
+import itertools
+from contextlib import asynccontextmanager
+from typing import Optional, Dict, Any
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is shed instead of admitted."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    def __init__(self, priority: int, sequence: int):
+        self.priority = priority
+        self.sequence = sequence
+        self.future = asyncio.get_running_loop().create_future()
+
+    def __lt__(self, other: "_Waiter") -> bool:
+        return (self.priority, self.sequence) < (other.priority, other.sequence)
+
+
+class AdmissionController:
+    """Bounded concurrency with a bounded, deadline-aware wait queue.
+
+    At most ``max_in_flight`` requests run at once and at most ``max_queue`` wait.
+    Requests are shed with a Retry-After hint when the queue is full, when their
+    expected queueing time (from the observed service time) exceeds
+    ``max_queue_wait``, or when they actually wait that long. With
+    ``prioritize_cheap`` enabled cheap requests are dequeued first and may take
+    the place of the newest cold waiter when the queue is full.
+    """
+
+    def __init__(self, max_in_flight: Optional[int] = None, max_queue: Optional[int] = None,
+                 max_queue_wait: Optional[float] = None, prioritize_cheap: Optional[bool] = None):
+        self.max_in_flight = max_in_flight or int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "32"))
+        self.max_queue = max_queue if max_queue is not None else int(os.getenv("ADMISSION_MAX_QUEUE", "64"))
+        self.max_queue_wait = max_queue_wait or float(os.getenv("ADMISSION_MAX_QUEUE_WAIT_SECONDS", "5"))
+        if prioritize_cheap is None:
+            prioritize_cheap = os.getenv("ADMISSION_PRIORITIZE_CHEAP", "true").lower() == "true"
+        self.prioritize_cheap = prioritize_cheap
+
+        self.in_flight = 0
+        self._queue = []
+        self._sequence = itertools.count()
+        self._service_time = None
+        self.admitted = 0
+        self.rejected = 0
+
+    def _expected_wait(self, position: int) -> float:
+        """Estimate how long a request at this queue position will wait."""
+        if self._service_time is None:
+            return 0.0
+        return (position + 1) * self._service_time / self.max_in_flight
+
+    def _retry_after(self) -> int:
+        return max(1, math.ceil(self._expected_wait(len(self._queue)) or self.max_queue_wait))
+
+    def _reject(self, reason: str) -> AdmissionRejected:
+        self.rejected += 1
+        return AdmissionRejected(reason, self._retry_after())
+
+    async def acquire(self, cheap: bool = False, max_wait: Optional[float] = None):
+        """Wait for a slot or raise AdmissionRejected."""
+        if self.in_flight < self.max_in_flight and not self._queue:
+            self.in_flight += 1
+            self.admitted += 1
+            return
+
+        priority = 0 if cheap and self.prioritize_cheap else 1
+        if len(self._queue) >= self.max_queue:
+            cold = [waiter for waiter in self._queue if waiter.priority > priority]
+            if not cold:
+                raise self._reject("queue full")
+            # Shed the newest cold waiter to make room for this cheaper request
+            victim = max(cold, key=lambda waiter: waiter.sequence)
+            self._queue.remove(victim)
+            heapq.heapify(self._queue)
+            victim.future.set_exception(self._reject("displaced by cheaper request"))
+
+        wait = self.max_queue_wait if max_wait is None else min(self.max_queue_wait, max_wait)
+        ahead = sum(1 for waiter in self._queue if waiter.priority <= priority)
+        if self._expected_wait(ahead) > wait:
+            raise self._reject("expected queue time too long")
+
+        waiter = _Waiter(priority, next(self._sequence))
+        heapq.heappush(self._queue, waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), timeout=max(wait, 0))
+        except asyncio.TimeoutError:
+            if waiter.future.done() and waiter.future.exception() is None:
+                # Granted just as the wait expired; hand the slot back
+                self.release()
+            elif waiter in self._queue:
+                self._queue.remove(waiter)
+                heapq.heapify(self._queue)
+            raise self._reject("queue timeout")
+        except asyncio.CancelledError:
+            if waiter.future.done() and waiter.future.exception() is None:
+                self.release()
+            elif waiter in self._queue:
+                self._queue.remove(waiter)
+                heapq.heapify(self._queue)
+            raise
+
+    def release(self):
+        """Free a slot and hand it to the next waiter, if any."""
+        self.in_flight -= 1
+        while self._queue:
+            waiter = heapq.heappop(self._queue)
+            if not waiter.future.done():
+                self.in_flight += 1
+                self.admitted += 1
+                waiter.future.set_result(None)
+                return
+
+    def _record_service_time(self, elapsed: float):
+        if self._service_time is None:
+            self._service_time = elapsed
+        else:
+            self._service_time = 0.8 * self._service_time + 0.2 * elapsed
+
+    @asynccontextmanager
+    async def admit(self, cheap: bool = False, max_wait: Optional[float] = None):
+        """Hold an admission slot for the duration of the block."""
+        await self.acquire(cheap=cheap, max_wait=max_wait)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._record_service_time(time.monotonic() - started)
+            self.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": self.in_flight,
+            "queued": len(self._queue),
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "avg_service_seconds": self._service_time
+        }
@@ -0,0 +1,293 @@
+import json
+import argparse
+from typing import List, Dict, Any, Optional, Tuple
+import numpy as np
+from models.study_models import StudyResponse, Topic, DayPlan, StudySession
+from services.study_guide_generator import StudyGuideGenerator
+
+# (topics in schedule order, hours per day, total days)
+PlanSpec = Tuple[List[Topic], float, int]
+
+_INITIAL_WINDOW = 16
+
+
+class BulkScheduler:
+    """Vectorized re-scheduling of many plans at once.
+
+    Produces exactly the timetables of ``StudyGuideGenerator._generate_timetable``:
+    topic hours are split into sessions for all plans together, then each day is
+    filled for every plan in one step by taking a cumulative sum over a window of
+    the plan's pending sessions and locating the first session that no longer fits.
+    """
+
+    def __init__(self, generator: StudyGuideGenerator):
+        self.generator = generator
+
+    def schedule(self, plans: List[PlanSpec]) -> List[List[Dict[str, Any]]]:
+        """Return each plan's timetable as a list of DayPlan dicts."""
+        if not plans:
+            return []
+
+        hours_per_day = np.array([float(hpd) for _, hpd, _ in plans], dtype=np.float64)
+        total_days = np.array([int(days) for _, _, days in plans], dtype=np.int64)
+        topics = [topic for plan_topics, _, _ in plans for topic in plan_topics]
+        topic_plan = np.repeat(np.arange(len(plans)), [len(plan_topics) for plan_topics, _, _ in plans])
+
+        chunk_topic, chunk_duration = self._split_topics(topics, topic_plan, hours_per_day)
+        chunk_plan = topic_plan[chunk_topic]
+        chunk_start = np.searchsorted(chunk_plan, np.arange(len(plans)), side="left")
+        chunk_end = np.searchsorted(chunk_plan, np.arange(len(plans)), side="right")
+
+        pieces, day_hours, fallback = self._fill_days(
+            chunk_duration, chunk_start, chunk_end, hours_per_day, total_days
+        )
+        return self._build_timetables(plans, topics, chunk_topic, chunk_duration, pieces, day_hours, fallback)
+
+    def replan(self, plans: List[StudyResponse], hours_per_day: Optional[float] = None,
+               total_days: Optional[int] = None) -> List[StudyResponse]:
+        """Re-plan stored plans, optionally under a new daily budget or plan length."""
+        specs = [
+            (plan.topics, hours_per_day or plan.hoursPerDay, total_days or plan.totalDays)
+            for plan in plans
+        ]
+        timetables = self.schedule(specs)
+
+        replanned = []
+        for plan, (_, hpd, days), timetable in zip(plans, specs, timetables):
+            replanned.append(plan.model_copy(update={
+                "hoursPerDay": hpd,
+                "totalDays": days,
+                "timetable": [
+                    DayPlan.model_construct(
+                        sessions=[StudySession.model_construct(**session) for session in day["sessions"]],
+                        notes=day["notes"]
+                    )
+                    for day in timetable
+                ]
+            }))
+        return replanned
+
+    def _split_topics(self, topics: List[Topic], topic_plan: np.ndarray,
+                      hours_per_day: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Split every topic into sessions of at most min(2h, hours per day).
+
+        Repeats the scalar ``remaining -= min(remaining, 2.0, hours_per_day)`` step for
+        all topics at once so durations match bit for bit. Sessions come back in
+        plan order, then topic order.
+        """
+        remaining = np.array([topic.estimatedHours for topic in topics], dtype=np.float64)
+        cap = np.minimum(2.0, hours_per_day[topic_plan]) if len(topics) else remaining
+        active = remaining > 0
+
+        durations, masks = [], []
+        while active.any():
+            duration = np.where(active, np.minimum(remaining, cap), 0.0)
+            durations.append(duration)
+            masks.append(active)
+            remaining = np.where(active, remaining - duration, remaining)
+            active = active & (remaining > 0)
+
+        if not durations:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64)
+
+        duration_matrix = np.stack(durations, axis=1)
+        mask_matrix = np.stack(masks, axis=1)
+        chunk_topic = np.nonzero(mask_matrix)[0]
+        return chunk_topic, duration_matrix[mask_matrix]
+
+    def _fill_days(self, chunk_duration: np.ndarray, chunk_start: np.ndarray, chunk_end: np.ndarray,
+                   hours_per_day: np.ndarray, total_days: np.ndarray):
+        """Assign sessions to days for all plans, one day per step.
+
+        Each plan's queue is a pointer into its sessions plus an optional carried
+        remainder of a session split on the previous day. Returns the scheduled
+        pieces as (plan, day, position, chunk, duration, activity_lo, activity_hi)
+        columns, the per-day hour totals and a mask of plans that hit a floating
+        point corner case and must be scheduled by the scalar path instead.
+        """
+        plan_count = len(hours_per_day)
+        max_days = int(total_days.max())
+        lookup = chunk_duration if len(chunk_duration) else np.zeros(1)
+
+        pointer = chunk_start.copy()
+        carry = np.zeros(plan_count, dtype=bool)
+        carry_chunk = np.zeros(plan_count, dtype=np.int64)
+        carry_duration = np.zeros(plan_count, dtype=np.float64)
+        carry_lo = np.zeros(plan_count, dtype=np.int64)
+        fallback = np.zeros(plan_count, dtype=bool)
+        day_hours = np.zeros((plan_count, max_days), dtype=np.float64)
+        columns = [[] for _ in range(7)]
+        window = _INITIAL_WINDOW
+
+        for day in range(max_days):
+            rows = np.nonzero((day < total_days) & ~fallback)[0]
+            if len(rows) == 0:
+                break
+
+            hpd = hours_per_day[rows][:, None]
+            has_carry = carry[rows]
+            offset = has_carry.astype(np.int64)
+            pending = chunk_end[rows] - pointer[rows] + offset
+
+            while True:
+                positions = np.arange(window)[None, :]
+                chunk_index = pointer[rows][:, None] + positions - offset[:, None]
+                is_chunk = (chunk_index >= pointer[rows][:, None]) & (chunk_index < chunk_end[rows][:, None])
+                is_carry = has_carry[:, None] & (positions == 0)
+                chunk_index = np.where(is_carry, carry_chunk[rows][:, None], chunk_index)
+
+                durations = np.where(is_chunk, lookup[np.clip(chunk_index, 0, len(lookup) - 1)], np.inf)
+                durations = np.where(is_carry, carry_duration[rows][:, None], durations)
+                is_piece = is_chunk | is_carry
+
+                # Same left-to-right accumulation as the scalar daily_hours counter
+                cumulative = np.cumsum(durations, axis=1)
+                fits = cumulative <= hpd
+                open_day = np.concatenate(
+                    [np.ones((len(rows), 1), dtype=bool), cumulative[:, :-1] < hpd], axis=1
+                )
+                accepted = np.logical_and.accumulate(fits & open_day & is_piece, axis=1)
+                taken = accepted.sum(axis=1)
+
+                if not ((taken == window) & (pending > window)).any():
+                    break
+                window *= 2
+
+            hours = np.where(taken > 0, cumulative[np.arange(len(rows)), np.maximum(taken - 1, 0)], 0.0)
+            at_stop = np.minimum(taken, window - 1)
+            stop_is_piece = (taken < window) & is_piece[np.arange(len(rows)), at_stop]
+            remaining = hpd[:, 0] - hours
+            split = stop_is_piece & (hours < hpd[:, 0]) & (remaining >= 0.5)
+
+            stop_chunk = chunk_index[np.arange(len(rows)), at_stop]
+            stop_duration = durations[np.arange(len(rows)), at_stop]
+            stop_lo = np.where(has_carry & (taken == 0), carry_lo[rows], 0)
+            rest = stop_duration - remaining
+            split_hours = hours + remaining
+
+            # After a split the scalar loop re-checks the remainder; if rounding lets it
+            # fit on the same day, defer that plan to the scalar scheduler
+            fallback[rows[split & (split_hours < hpd[:, 0]) & (split_hours + rest <= hpd[:, 0])]] = True
+
+            accepted_rows, accepted_positions = np.nonzero(accepted)
+            accepted_is_carry = is_carry[accepted_rows, accepted_positions]
+            columns[0].append(rows[accepted_rows])
+            columns[1].append(np.full(len(accepted_rows), day))
+            columns[2].append(accepted_positions)
+            columns[3].append(chunk_index[accepted_rows, accepted_positions])
+            columns[4].append(durations[accepted_rows, accepted_positions])
+            columns[5].append(np.where(accepted_is_carry, carry_lo[rows][accepted_rows], 0))
+            columns[6].append(np.full(len(accepted_rows), -1))
+
+            split_rows = np.nonzero(split)[0]
+            columns[0].append(rows[split_rows])
+            columns[1].append(np.full(len(split_rows), day))
+            columns[2].append(taken[split_rows])
+            columns[3].append(stop_chunk[split_rows])
+            columns[4].append(remaining[split_rows])
+            columns[5].append(stop_lo[split_rows])
+            columns[6].append(stop_lo[split_rows] + 2)
+
+            consumed = taken + split
+            pointer[rows] += np.where(has_carry, np.maximum(consumed - 1, 0), consumed)
+            carry[rows] = (has_carry & (consumed == 0)) | split
+            carry_chunk[rows] = np.where(split, stop_chunk, carry_chunk[rows])
+            carry_duration[rows] = np.where(split, rest, carry_duration[rows])
+            carry_lo[rows] = np.where(split, stop_lo + 2, carry_lo[rows])
+            day_hours[rows, day] = np.where(split, split_hours, hours)
+
+        pieces = [np.concatenate(column) if column else np.zeros(0) for column in columns]
+        order = np.lexsort((pieces[2], pieces[1], pieces[0]))
+        return [column[order] for column in pieces], day_hours, fallback
+
+    def _build_timetables(self, plans: List[PlanSpec], topics: List[Topic], chunk_topic: np.ndarray,
+                          chunk_duration: np.ndarray, pieces, day_hours: np.ndarray,
+                          fallback: np.ndarray) -> List[List[Dict[str, Any]]]:
+        """Materialize the scheduled pieces as plain DayPlan dicts."""
+        generator = self.generator
+        titles = [topic.title for topic in topics]
+        priorities = [topic.priority for topic in topics]
+        descriptions = [generator._session_description(topic) for topic in topics]
+        suggested_times = [generator._get_suggested_time(topic.priority) for topic in topics]
+        chunk_topics = chunk_topic.tolist()
+        chunk_buckets = np.where(chunk_duration >= 2.0, 2.0, np.where(chunk_duration >= 1.0, 1.0, 0.5)).tolist()
+        activity_cache = {}
+        notes_cache = {}
+
+        timetables = [
+            [{"sessions": [], "notes": None} for _ in range(int(days))]
+            for _, _, days in plans
+        ]
+        high_counts = np.zeros(day_hours.shape, dtype=np.int64)
+
+        for plan, day, _, chunk, duration, lo, hi in zip(*(column.tolist() for column in pieces)):
+            if fallback[plan]:
+                continue
+            topic_index = chunk_topics[chunk]
+            key = (topic_index, chunk_buckets[chunk])
+            activities = activity_cache.get(key)
+            if activities is None:
+                activities = activity_cache[key] = generator._generate_activities(topics[topic_index], key[1])
+            timetables[plan][day]["sessions"].append({
+                "topic": titles[topic_index],
+                "duration": duration,
+                "priority": priorities[topic_index],
+                "description": descriptions[topic_index],
+                "suggestedTime": suggested_times[topic_index],
+                "activities": activities[lo:] if hi < 0 else activities[lo:hi]
+            })
+            if priorities[topic_index] == 'high':
+                high_counts[plan, day] += 1
+
+        for plan, (plan_topics, hpd, days) in enumerate(plans):
+            if fallback[plan]:
+                timetables[plan] = [
+                    day_plan.model_dump()
+                    for day_plan in generator._generate_timetable(plan_topics, hpd, days)
+                ]
+                continue
+            for day, day_plan in enumerate(timetables[plan]):
+                key = (day, int(days), int(high_counts[plan, day]), float(day_hours[plan, day]))
+                notes = notes_cache.get(key)
+                if notes is None:
+                    notes = notes_cache[key] = generator._daily_notes_text(*key)
+                day_plan["notes"] = notes
+
+        return timetables
+
+
+def main(argv: Optional[List[str]] = None):
+    """Re-plan a JSON file of stored study plans in bulk."""
+    parser = argparse.ArgumentParser(description="Bulk re-plan study plan timetables")
+    parser.add_argument("input", help="JSON file containing a list of study plans")
+    parser.add_argument("-o", "--output", help="Where to write the re-planned plans (default: stdout)")
+    parser.add_argument("--hours-per-day", type=float, help="New hours per day for every plan")
+    parser.add_argument("--total-days", type=int, help="New number of days for every plan")
+    args = parser.parse_args(argv)
+
+    with open(args.input) as f:
+        plans = json.load(f)
+
+    specs = [
+        (
+            [Topic(**topic) for topic in plan["topics"]],
+            args.hours_per_day or plan["hoursPerDay"],
+            args.total_days or plan["totalDays"]
+        )
+        for plan in plans
+    ]
+    timetables = BulkScheduler(StudyGuideGenerator(openai_service=None)).schedule(specs)
+
+    for plan, (_, hpd, days), timetable in zip(plans, specs, timetables):
+        plan.update(hoursPerDay=hpd, totalDays=days, timetable=timetable)
+
+    output = json.dumps(plans, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
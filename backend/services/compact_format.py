@@ -0,0 +1,98 @@
+from typing import List, Dict, Any, Optional
+from models.study_models import StudyResponse
+
+COMPACT_MEDIA_TYPE = "application/vnd.studyguide.compact+json"
+COMPACT_FORMAT_VERSION = "compact-v1"
+
+
+def wants_compact(accept: Optional[str], format_param: Optional[str]) -> bool:
+    """Check whether the client negotiated the compact wire format."""
+    if format_param:
+        return format_param.strip().lower() == "compact"
+    return bool(accept) and COMPACT_MEDIA_TYPE in accept
+
+
+def to_compact(plan: StudyResponse) -> Optional[Dict[str, Any]]:
+    """Encode a study plan in the compact wire format.
+
+    Sessions are encoded as ``[topic, duration, description, suggestedTime, activities]``
+    where ``topic`` indexes ``topics`` and the remaining string fields index the shared
+    ``strings`` table (``-1`` for a missing suggested time). Returns None when a session
+    cannot be expressed against the topic list, so callers fall back to the full format.
+    """
+    topic_index = {}
+    for index, topic in enumerate(plan.topics):
+        topic_index.setdefault(topic.title, index)
+
+    strings: List[str] = []
+    string_index: Dict[str, int] = {}
+
+    def intern(value: str) -> int:
+        index = string_index.get(value)
+        if index is None:
+            index = string_index[value] = len(strings)
+            strings.append(value)
+        return index
+
+    timetable = []
+    for day in plan.timetable:
+        sessions = []
+        for session in day.sessions:
+            index = topic_index.get(session.topic)
+            if index is None or plan.topics[index].priority != session.priority:
+                return None
+            sessions.append([
+                index,
+                session.duration,
+                intern(session.description),
+                intern(session.suggestedTime) if session.suggestedTime is not None else -1,
+                [intern(activity) for activity in session.activities or []]
+            ])
+        timetable.append({"s": sessions, "n": day.notes})
+
+    return {
+        "format": COMPACT_FORMAT_VERSION,
+        "subject": plan.subject,
+        "hoursPerDay": plan.hoursPerDay,
+        "totalDays": plan.totalDays,
+        "overview": plan.overview,
+        "topics": [topic.model_dump() for topic in plan.topics],
+        "strings": strings,
+        "timetable": timetable,
+        "email": plan.email,
+        "generatedAt": plan.generatedAt.isoformat(),
+        "planId": plan.planId
+    }
+
+
+def from_compact(data: Dict[str, Any]) -> StudyResponse:
+    """Expand a compact payload back into a full study plan."""
+    topics = data["topics"]
+    strings = data["strings"]
+
+    timetable = []
+    for day in data["timetable"]:
+        sessions = []
+        for index, duration, description, suggested_time, activities in day["s"]:
+            topic = topics[index]
+            sessions.append({
+                "topic": topic["title"],
+                "duration": duration,
+                "priority": topic["priority"],
+                "description": strings[description],
+                "suggestedTime": strings[suggested_time] if suggested_time >= 0 else None,
+                "activities": [strings[activity] for activity in activities]
+            })
+        timetable.append({"sessions": sessions, "notes": day.get("n")})
+
+    return StudyResponse(
+        subject=data["subject"],
+        hoursPerDay=data["hoursPerDay"],
+        totalDays=data["totalDays"],
+        overview=data.get("overview"),
+        topics=topics,
+        timetable=timetable,
+        email=data.get("email"),
+        generatedAt=data["generatedAt"],
+        planId=data.get("planId")
+    )
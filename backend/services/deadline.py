@@ -0,0 +1,45 @@
+import os
+import math
+import time
+from typing import Optional
+
+# Below this much remaining budget a stage is skipped rather than started
+MIN_STAGE_SECONDS = float(os.getenv("MIN_STAGE_SECONDS", "0.5"))
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a stage has no time budget left to run."""
+
+
+class Deadline:
+    """End-to-end time budget for a request, measured on the monotonic clock."""
+
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+        self.expires_at = time.monotonic() + timeout
+
+    @classmethod
+    def from_header(cls, value: Optional[str]) -> "Deadline":
+        """Build a deadline from an X-Request-Timeout header (seconds), capped by the server default."""
+        default = float(os.getenv("GENERATION_DEADLINE_SECONDS", "30"))
+        try:
+            requested = float(value) if value else default
+        except ValueError:
+            requested = default
+        if not math.isfinite(requested):
+            requested = default
+        return cls(min(max(requested, 0.0), default))
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def stage_timeout(self) -> float:
+        """Budget for the next stage, or DeadlineExceeded if too little is left."""
+        remaining = self.remaining()
+        if remaining < MIN_STAGE_SECONDS:
+            raise DeadlineExceeded(f"{remaining:.2f}s left of {self.timeout:.2f}s budget")
+        return remaining
@@ -0,0 +1,83 @@
+import os
+import asyncio
+import logging
+from typing import Optional
+from models.study_models import StudyRequest
+from services.reminder_service import celery_app, ReminderService
+from services.openai_service import OpenAIService
+from services.study_guide_generator import StudyGuideGenerator
+from services.deadline import Deadline
+
+logger = logging.getLogger(__name__)
+
+# One event loop and generator per worker process so the OpenAI connection pool is reused
+_loop = None
+_generator = None
+
+
+def _get_generator():
+    global _generator
+    if _generator is None:
+        _generator = StudyGuideGenerator(OpenAIService())
+    return _generator
+
+
+def _run(coroutine):
+    global _loop
+    if _loop is None or _loop.is_closed():
+        _loop = asyncio.new_event_loop()
+    return _loop.run_until_complete(coroutine)
+
+
+class GenerationJobRegistry:
+    """Records queued job IDs in Redis so unknown or expired IDs can be told apart.
+
+    Celery reports any ID it has no result for as PENDING, which would leave
+    pollers of a mistyped or expired job waiting forever.
+    """
+
+    key_prefix = "generation-job:"
+
+    def __init__(self, ttl: Optional[int] = None):
+        self.ttl = ttl or int(os.getenv("GENERATION_JOB_TTL_SECONDS", "86400"))
+
+    def record(self, job_id: str):
+        celery_app.backend.client.set(self.key_prefix + job_id, 1, ex=self.ttl)
+
+    def exists(self, job_id: str) -> bool:
+        return bool(celery_app.backend.client.exists(self.key_prefix + job_id))
+
+
+generation_jobs = GenerationJobRegistry()
+
+
+async def _generate(request: StudyRequest, on_progress):
+    deadline = Deadline(float(os.getenv("GENERATION_JOB_DEADLINE_SECONDS", "120")))
+    plan = await _get_generator().generate_complete_plan(request, deadline=deadline, on_progress=on_progress)
+
+    if request.email:
+        try:
+            on_progress("reminders")
+            await ReminderService().setup_reminders(request.email, plan)
+        except Exception as e:
+            # Don't fail the whole job if reminders fail
+            logger.warning("Failed to setup reminders: %s", e)
+
+    return plan
+
+
+@celery_app.task(bind=True, name='generate_study_plan', track_started=True)
+def generate_study_plan(self, request_data: dict, client: str = "unknown"):
+    """Generate a complete study plan in a worker, reporting the current stage as progress.
+
+    The worker's token usage is returned with the plan so the API can add it
+    to its own per-subject and per-client aggregates.
+    """
+
+    def on_progress(stage: str):
+        self.update_state(state='PROGRESS', meta={'stage': stage})
+
+    request = StudyRequest(**request_data)
+    with _get_generator().openai_service.usage_tracker.track_request(request.subject, client) as usage:
+        plan = _run(_generate(request, on_progress))
+    return {"plan": plan.model_dump(mode='json'), "client": client, "usage": usage.stages}
@@ -0,0 +1,117 @@
+import os
+import logging
+import httpx
+from typing import Any, Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class _TrackedStream(httpx.AsyncByteStream):
+    """Response body wrapper that reports when the body has been fully consumed."""
+
+    def __init__(self, stream: httpx.AsyncByteStream, on_close: Callable[[], None]):
+        self._stream = stream
+        self._on_close = on_close
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            if self._on_close:
+                self._on_close()
+                self._on_close = None
+
+
+class MonitoredTransport(httpx.AsyncHTTPTransport):
+    """Connection-pooling transport that counts requests, in-flight bodies and new connections."""
+
+    def __init__(self, limits: httpx.Limits, **kwargs):
+        super().__init__(limits=limits, **kwargs)
+        self.limits = limits
+        self.requests = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.connections_opened = 0
+
+    def _finished(self):
+        self.in_flight -= 1
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+        outer_trace = request.extensions.get("trace")
+
+        async def trace(event: str, info: Dict[str, Any]):
+            if event == "connection.connect_tcp.complete":
+                self.connections_opened += 1
+            if outer_trace:
+                await outer_trace(event, info)
+
+        request.extensions["trace"] = trace
+        try:
+            response = await super().handle_async_request(request)
+        except BaseException:
+            self._finished()
+            raise
+
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=response.headers,
+            stream=_TrackedStream(response.stream, self._finished),
+            extensions=response.extensions,
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        connections = list(getattr(self._pool, "connections", []))
+        idle = sum(1 for connection in connections if connection.is_idle())
+        return {
+            "max_connections": self.limits.max_connections,
+            "max_keepalive_connections": self.limits.max_keepalive_connections,
+            "open_connections": len(connections),
+            "idle_connections": idle,
+            "active_connections": len(connections) - idle,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "requests": self.requests,
+            "connections_opened": self.connections_opened,
+            "reuse_ratio": round(1 - self.connections_opened / self.requests, 3) if self.requests else None,
+        }
+
+
+def build_transport() -> MonitoredTransport:
+    """Create the pooled transport for the OpenAI SDK from the OPENAI_* pool settings."""
+    http2 = os.getenv("OPENAI_HTTP2", "false").lower() == "true"
+    if http2 and not _http2_available():
+        logger.warning("OPENAI_HTTP2 is enabled but the h2 package is missing; using HTTP/1.1")
+        http2 = False
+
+    limits = httpx.Limits(
+        max_connections=int(os.getenv("OPENAI_MAX_CONNECTIONS", "100")),
+        max_keepalive_connections=int(os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", "20")),
+        keepalive_expiry=float(os.getenv("OPENAI_KEEPALIVE_EXPIRY_SECONDS", "30")),
+    )
+    return MonitoredTransport(limits=limits, http2=http2)
+
+
+def build_http_client(transport: MonitoredTransport) -> httpx.AsyncClient:
+    """Create the HTTP client for the OpenAI SDK with the configured timeouts."""
+    timeout = httpx.Timeout(
+        float(os.getenv("OPENAI_TIMEOUT_SECONDS", "60")),
+        connect=float(os.getenv("OPENAI_CONNECT_TIMEOUT_SECONDS", "5")),
+        pool=float(os.getenv("OPENAI_POOL_TIMEOUT_SECONDS", "10")),
+    )
+    return httpx.AsyncClient(transport=transport, timeout=timeout, follow_redirects=True)
@@ -0,0 +1,60 @@
+import os
+import time
+import asyncio
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Optional, Tuple
+
+
+class IdempotencyConflict(Exception):
+    """Raised when an idempotency key is reused with a different request body."""
+
+
+class _Entry:
+    def __init__(self, fingerprint: str, task: asyncio.Future, expires_at: float):
+        self.fingerprint = fingerprint
+        self.task = task
+        self.expires_at = expires_at
+
+
+class IdempotencyStore:
+    """TTL store mapping idempotency keys to the result (or in-flight task) of the first request.
+
+    The work runs as its own task so a retry can attach to it even after the
+    original client has gone away. Failed attempts are forgotten so the next
+    retry runs the work again.
+    """
+
+    def __init__(self, ttl: Optional[float] = None, max_entries: Optional[int] = None):
+        self.ttl = ttl or float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+        self.max_entries = max_entries or int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "10000"))
+        self._entries = OrderedDict()
+
+    def _purge(self, now: float):
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if entry.expires_at > now and len(self._entries) <= self.max_entries:
+                break
+            self._entries.popitem(last=False)
+
+    async def run(self, key: str, fingerprint: str,
+                  work: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Run work once per key; returns (result, replayed)."""
+        now = time.monotonic()
+        self._purge(now)
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry.fingerprint != fingerprint:
+                raise IdempotencyConflict("Idempotency key was already used with a different request")
+            return await asyncio.shield(entry.task), True
+
+        task = asyncio.ensure_future(work())
+        entry = _Entry(fingerprint, task, now + self.ttl)
+        self._entries[key] = entry
+
+        def forget_failure(finished: asyncio.Future):
+            if (finished.cancelled() or finished.exception() is not None) and self._entries.get(key) is entry:
+                del self._entries[key]
+
+        task.add_done_callback(forget_failure)
+        return await asyncio.shield(task), False
@@ -0,0 +1,101 @@
+import os
+import asyncio
+import logging
+import contextvars
+from types import SimpleNamespace
+from typing import Any, List, Optional
+from services.deadline import Deadline
+
+logger = logging.getLogger(__name__)
+
+
+class _PendingOverview:
+    def __init__(self, subject: str, topic_titles: List[str], deadline: Optional[Deadline]):
+        self.subject = subject
+        self.topic_titles = topic_titles
+        self.deadline = deadline
+        self.future = asyncio.get_running_loop().create_future()
+        # Usage of the shared completion is attributed back to each request
+        self.context = contextvars.copy_context()
+
+
+class OverviewBatcher:
+    """Collects overview requests arriving within a short window into one completion.
+
+    The batch is sent when the window closes or ``max_batch`` requests are
+    waiting. Each caller waits only as long as its own deadline allows and
+    gets None (so it can use its fallback text) if its item fails or is
+    missing from the batched reply.
+    """
+
+    def __init__(self, service: Any, window_ms: Optional[float] = None, max_batch: Optional[int] = None):
+        self.service = service
+        self.window = (window_ms if window_ms is not None else float(os.getenv("OVERVIEW_BATCH_WINDOW_MS", "0"))) / 1000
+        self.max_batch = max_batch or int(os.getenv("OVERVIEW_BATCH_MAX_SIZE", "8"))
+        self._pending: List[_PendingOverview] = []
+        self._timer = None
+        # Strong references to in-flight sends; the event loop only keeps weak ones
+        self._tasks = set()
+        self.batches_sent = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0
+
+    async def submit(self, subject: str, topic_titles: List[str],
+                     deadline: Optional[Deadline] = None) -> Optional[str]:
+        item = _PendingOverview(subject, topic_titles, deadline)
+        self._pending.append(item)
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self._flush)
+
+        try:
+            timeout = deadline.remaining() if deadline else None
+            return await asyncio.wait_for(asyncio.shield(item.future), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._send(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, batch: List[_PendingOverview]):
+        # The batch may run as long as its most patient caller is still waiting
+        deadlines = [item.deadline for item in batch]
+        deadline = None if None in deadlines else Deadline(max(d.remaining() for d in deadlines))
+
+        self.batches_sent += 1
+        try:
+            overviews, usage = await self.service.generate_overview_batch(
+                [(item.subject, item.topic_titles) for item in batch],
+                deadline=deadline
+            )
+        except Exception as e:
+            logger.warning("Batched overview generation failed for %d requests: %s", len(batch), e)
+            overviews, usage = [None] * len(batch), None
+
+        if usage is not None:
+            self._attribute_usage(batch, usage)
+        for item, overview in zip(batch, overviews):
+            if not item.future.done():
+                item.future.set_result(overview)
+
+    def _attribute_usage(self, batch: List[_PendingOverview], usage: Any):
+        """Split the shared completion's tokens evenly across the batched requests."""
+        prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+        completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+        count = len(batch)
+        for index, item in enumerate(batch):
+            share = SimpleNamespace(
+                prompt_tokens=prompt_tokens // count + (prompt_tokens % count if index == 0 else 0),
+                completion_tokens=completion_tokens // count + (completion_tokens % count if index == 0 else 0)
+            )
+            item.context.run(self.service.usage_tracker.record, "overview", share)
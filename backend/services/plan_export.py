@@ -0,0 +1,295 @@
+import os
+import re
+import textwrap
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Iterator, List, Optional, Tuple
+from models.study_models import StudyResponse
+
+EXPORT_FORMATS = {
+    "ics": ("text/calendar; charset=utf-8", "ics"),
+    "md": ("text/markdown; charset=utf-8", "md"),
+    "pdf": ("application/pdf", "pdf"),
+}
+
+EXPORT_SECTIONS = ("guide", "timetable", "both")
+
+_TIME_PATTERN = re.compile(r"(\d{1,2}):(\d{2})\s*([AP]M)", re.IGNORECASE)
+
+
+def _parse_start_time(suggested_time: Optional[str]) -> Tuple[int, int]:
+    """Parse the start of a suggested time slot like '9:00 AM - 11:00 AM (...)'."""
+    match = _TIME_PATTERN.search(suggested_time or "")
+    if not match:
+        return 9, 0
+    hour, minute, meridiem = int(match.group(1)) % 12, int(match.group(2)), match.group(3).upper()
+    if meridiem == "PM":
+        hour += 12
+    return hour, minute
+
+
+def _ics_escape(value: str) -> str:
+    return (value.replace("\\", "\\\\").replace(";", "\\;")
+            .replace(",", "\\,").replace("\n", "\\n"))
+
+
+def _ics_line(line: str) -> str:
+    """Fold a content line at 75 octets as required by RFC 5545."""
+    encoded = line.encode("utf-8")
+    if len(encoded) <= 75:
+        return line + "\r\n"
+
+    parts = []
+    current = b""
+    limit = 75
+    for char in line:
+        char_bytes = char.encode("utf-8")
+        if len(current) + len(char_bytes) > limit:
+            parts.append(current.decode("utf-8"))
+            current = b""
+            limit = 74
+        current += char_bytes
+    parts.append(current.decode("utf-8"))
+    return "\r\n ".join(parts) + "\r\n"
+
+
+def render_ics(plan: StudyResponse, content_hash: str) -> Iterator[str]:
+    """Render the timetable as an iCalendar feed, one event per study session.
+
+    Day 1 is the day the plan was generated; sessions start at their suggested
+    time and sessions sharing a slot are stacked back to back.
+    """
+    generated_at = plan.generatedAt
+    if generated_at.tzinfo is None:
+        generated_at = generated_at.replace(tzinfo=timezone.utc)
+    stamp = generated_at.astimezone(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    start_date = plan.generatedAt.date()
+
+    yield _ics_line("BEGIN:VCALENDAR")
+    yield _ics_line("VERSION:2.0")
+    yield _ics_line("PRODID:-//Study Guide Generator//Study Plan//EN")
+    yield _ics_line("CALSCALE:GREGORIAN")
+    yield _ics_line(f"X-WR-CALNAME:{_ics_escape(plan.subject)} Study Plan")
+
+    for day_index, day in enumerate(plan.timetable):
+        day_date = start_date + timedelta(days=day_index)
+        slot_cursor = {}
+
+        for session_index, session in enumerate(day.sessions):
+            hour, minute = _parse_start_time(session.suggestedTime)
+            start = slot_cursor.get((hour, minute))
+            if start is None:
+                start = datetime(day_date.year, day_date.month, day_date.day, hour, minute)
+            minutes = int(round(session.duration * 60))
+            slot_cursor[(hour, minute)] = start + timedelta(minutes=minutes)
+
+            description = session.description
+            if session.activities:
+                description += "\n" + "\n".join(f"- {activity}" for activity in session.activities)
+
+            yield _ics_line("BEGIN:VEVENT")
+            yield _ics_line(f"UID:{content_hash[:16]}-{day_index + 1}-{session_index + 1}@study-guide")
+            yield _ics_line(f"DTSTAMP:{stamp}")
+            yield _ics_line(f"DTSTART:{start.strftime('%Y%m%dT%H%M%S')}")
+            yield _ics_line(f"DURATION:PT{minutes // 60}H{minutes % 60}M")
+            yield _ics_line(f"SUMMARY:{_ics_escape(f'{plan.subject}: {session.topic}')}")
+            yield _ics_line(f"DESCRIPTION:{_ics_escape(description)}")
+            yield _ics_line("END:VEVENT")
+
+    yield _ics_line("END:VCALENDAR")
+
+
+def render_markdown(plan: StudyResponse, sections: str = "both") -> Iterator[str]:
+    """Render the study guide and/or timetable as Markdown."""
+    yield f"# {plan.subject} Study Plan\n\n"
+    yield f"Study Period: {plan.totalDays} days, {plan.hoursPerDay} hours/day\n\n"
+
+    if sections in ("guide", "both"):
+        if plan.overview:
+            yield f"## Overview\n\n{plan.overview}\n\n"
+
+        yield "## Study Topics\n\n"
+        for index, topic in enumerate(plan.topics):
+            lines = [
+                f"### {index + 1}. {topic.title}\n\n",
+                f"*Priority: {topic.priority} | Difficulty: {topic.difficulty} | Est. Time: {topic.estimatedHours}h*\n\n",
+                f"{topic.summary}\n\n"
+            ]
+            if topic.keyPoints:
+                lines.append("**Key Points:**\n\n")
+                lines.extend(f"- {point}\n" for point in topic.keyPoints)
+                lines.append("\n")
+            if topic.resources:
+                lines.append("**Recommended Resources:**\n\n")
+                lines.extend(f"- {resource}\n" for resource in topic.resources)
+                lines.append("\n")
+            yield "".join(lines)
+
+    if sections in ("timetable", "both"):
+        yield "## Study Timetable\n\n"
+        for day_index, day in enumerate(plan.timetable):
+            lines = [f"### Day {day_index + 1}\n\n"]
+            for session in day.sessions:
+                lines.append(f"- **{session.topic}** ({session.duration}h, {session.priority} priority)")
+                if session.suggestedTime:
+                    lines.append(f" - {session.suggestedTime}")
+                lines.append("\n")
+                lines.extend(f"  - {activity}\n" for activity in session.activities or [])
+            if day.notes:
+                lines.append(f"\n> {day.notes}\n")
+            lines.append("\n")
+            yield "".join(lines)
+
+
+# Minimal PDF layout: A4 pages, Helvetica, fixed line height
+_PDF_PAGE_WIDTH = 595
+_PDF_PAGE_HEIGHT = 842
+_PDF_MARGIN = 50
+_PDF_LINE_HEIGHT = 14
+_PDF_LINES_PER_PAGE = (_PDF_PAGE_HEIGHT - 2 * _PDF_MARGIN) // _PDF_LINE_HEIGHT
+
+
+def _pdf_lines(plan: StudyResponse, sections: str) -> Iterator[Tuple[str, int, str]]:
+    """Yield (font, size, text) lines for the PDF renderer."""
+    yield "F2", 18, f"{plan.subject} Study Plan"
+    yield "F1", 11, f"Study Period: {plan.totalDays} days - {plan.hoursPerDay} hours/day"
+    yield "F1", 11, ""
+
+    def wrapped(text: str, indent: int = 0, width: int = 90) -> Iterator[Tuple[str, int, str]]:
+        for line in textwrap.wrap(text, width=width - indent) or [""]:
+            yield "F1", 10, " " * indent + line
+
+    if sections in ("guide", "both"):
+        if plan.overview:
+            yield "F2", 14, "Overview"
+            for paragraph in plan.overview.split("\n"):
+                yield from wrapped(paragraph)
+            yield "F1", 10, ""
+
+        yield "F2", 14, "Study Topics"
+        for index, topic in enumerate(plan.topics):
+            yield "F2", 12, f"{index + 1}. {topic.title}"
+            yield "F1", 10, (f"   Priority: {topic.priority} - Difficulty: {topic.difficulty}"
+                             f" - Est. Time: {topic.estimatedHours}h")
+            yield from wrapped(topic.summary, indent=3)
+            for point in topic.keyPoints or []:
+                yield from wrapped(f"- {point}", indent=5)
+            yield "F1", 10, ""
+
+    if sections in ("timetable", "both"):
+        yield "F2", 14, "Study Timetable"
+        for day_index, day in enumerate(plan.timetable):
+            yield "F2", 12, f"Day {day_index + 1}"
+            for session in day.sessions:
+                yield "F2", 10, f"   {session.topic} ({session.duration}h)"
+                yield "F1", 10, f"      Priority: {session.priority}"
+                if session.suggestedTime:
+                    yield "F1", 10, f"      Suggested time: {session.suggestedTime}"
+            yield "F1", 10, ""
+
+
+def _pdf_text(text: str) -> bytes:
+    """Escape a line for a PDF string literal in WinAnsi (cp1252) encoding.
+
+    Curly quotes and dashes survive; characters the base fonts can't show
+    (CJK, most non-Latin scripts) become "?" rather than vanishing.
+    """
+    text = text.strip("\n").replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+    return text.encode("cp1252", "replace")
+
+
+def render_pdf(plan: StudyResponse, sections: str = "both") -> Iterator[bytes]:
+    """Stream a text PDF page by page, writing the xref table once all objects are out.
+
+    Objects 1-3 are the catalog, page tree and fonts; each page adds a content
+    stream and a page object, and the page tree is written last.
+    """
+    offsets = {}
+    position = 0
+
+    def emit(number: int, body: bytes) -> bytes:
+        nonlocal position
+        offsets[number] = position
+        chunk = f"{number} 0 obj\n".encode("latin-1") + body + b"\nendobj\n"
+        position += len(chunk)
+        return chunk
+
+    header = b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n"
+    position = len(header)
+    yield header
+    yield emit(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+    yield emit(3, b"<< /Font << /F1 << /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>"
+                  b" /F2 << /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >> >> >>")
+
+    page_numbers = []
+    next_number = 4
+    lines = list(_pdf_lines(plan, sections))
+
+    for start in range(0, len(lines), _PDF_LINES_PER_PAGE):
+        commands = [b"BT", f"{_PDF_MARGIN} {_PDF_PAGE_HEIGHT - _PDF_MARGIN} Td".encode("latin-1"),
+                    f"{_PDF_LINE_HEIGHT} TL".encode("latin-1")]
+        for font, size, text in lines[start:start + _PDF_LINES_PER_PAGE]:
+            commands.append(f"/{font} {size} Tf (".encode("latin-1") + _pdf_text(text) + b") Tj T*")
+        commands.append(b"ET")
+        stream = b"\n".join(commands)
+
+        content_number, page_number = next_number, next_number + 1
+        next_number += 2
+        yield emit(content_number, f"<< /Length {len(stream)} >>\nstream\n".encode("latin-1") + stream + b"\nendstream")
+        yield emit(page_number, (f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {_PDF_PAGE_WIDTH} {_PDF_PAGE_HEIGHT}]"
+                                 f" /Resources 3 0 R /Contents {content_number} 0 R >>").encode("latin-1"))
+        page_numbers.append(page_number)
+
+    kids = " ".join(f"{number} 0 R" for number in page_numbers)
+    yield emit(2, f"<< /Type /Pages /Kids [{kids}] /Count {len(page_numbers)} >>".encode("latin-1"))
+
+    xref = [f"xref\n0 {next_number}\n", "0000000000 65535 f \n"]
+    xref.extend(f"{offsets[number]:010d} 00000 n \n" for number in range(1, next_number))
+    xref.append(f"trailer\n<< /Size {next_number} /Root 1 0 R >>\nstartxref\n{position}\n%%EOF\n")
+    yield "".join(xref).encode("latin-1")
+
+
+def render_export(plan: StudyResponse, content_hash: str, export_format: str, sections: str = "both") -> Iterator[bytes]:
+    """Stream a plan export in the requested format as bytes."""
+    if export_format == "pdf":
+        yield from render_pdf(plan, sections)
+        return
+
+    chunks = render_ics(plan, content_hash) if export_format == "ics" else render_markdown(plan, sections)
+    for chunk in chunks:
+        yield chunk.encode("utf-8")
+
+
+class ExportCache:
+    """Content-addressed cache of rendered exports, bounded by total bytes."""
+
+    def __init__(self, max_bytes: Optional[int] = None):
+        self.max_bytes = max_bytes or int(os.getenv("EXPORT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+        self._entries = OrderedDict()
+        self._size = 0
+
+    def get(self, key: Tuple[str, ...]) -> Optional[bytes]:
+        content = self._entries.get(key)
+        if content is not None:
+            self._entries.move_to_end(key)
+        return content
+
+    def put(self, key: Tuple[str, ...], content: bytes):
+        if len(content) > self.max_bytes:
+            return
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._size -= len(previous)
+        self._entries[key] = content
+        self._size += len(content)
+        while self._size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= len(evicted)
+
+    def stream(self, key: Tuple[str, ...], chunks: Iterator[bytes]) -> Iterator[bytes]:
+        """Pass chunks through to the client and cache the export once it completes."""
+        rendered: List[bytes] = []
+        for chunk in chunks:
+            rendered.append(chunk)
+            yield chunk
+        self.put(key, b"".join(rendered))
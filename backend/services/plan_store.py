@@ -0,0 +1,61 @@
+import os
+import json
+import hashlib
+import uuid
+from collections import OrderedDict
+from typing import List, Optional
+from models.study_models import StudyResponse
+
+
+def plan_hash(plan: StudyResponse) -> str:
+    """Content hash of a study plan, independent of the plan ID it is stored under."""
+    payload = plan.model_dump(mode="json", exclude={"planId"})
+    encoded = json.dumps(payload, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+class StoredPlan:
+    def __init__(self, plan_id: str, plan: StudyResponse, owner: Optional[str] = None):
+        self.plan_id = plan_id
+        self.plan = plan
+        self.owner = owner
+        self.content_hash = plan_hash(plan)
+
+
+class PlanStore:
+    """In-memory store of generated plans, evicting the least recently used."""
+
+    def __init__(self, max_plans: Optional[int] = None):
+        self.max_plans = max_plans or int(os.getenv("PLAN_STORE_MAX_PLANS", "1000"))
+        self._plans = OrderedDict()
+
+    def save(self, plan: StudyResponse, owner: Optional[str] = None) -> StoredPlan:
+        """Store a new plan and stamp it with its plan ID."""
+        plan.planId = uuid.uuid4().hex
+        return self.put(plan.planId, plan, owner)
+
+    def put(self, plan_id: str, plan: StudyResponse, owner: Optional[str] = None) -> StoredPlan:
+        """Insert or replace the plan stored under plan_id, keeping its owner unless one is given."""
+        plan.planId = plan_id
+        previous = self._plans.get(plan_id)
+        if owner is None and previous is not None:
+            owner = previous.owner
+        stored = StoredPlan(plan_id, plan, owner)
+        self._plans[plan_id] = stored
+        self._plans.move_to_end(plan_id)
+        while len(self._plans) > self.max_plans:
+            self._plans.popitem(last=False)
+        return stored
+
+    def get(self, plan_id: str) -> Optional[StoredPlan]:
+        stored = self._plans.get(plan_id)
+        if stored is not None:
+            self._plans.move_to_end(plan_id)
+        return stored
+
+    def list(self, owner: Optional[str] = None) -> List[StoredPlan]:
+        """Stored plans, most recently used first; only owner's plans when an owner is given."""
+        plans = reversed(self._plans.values())
+        if owner is not None:
+            return [stored for stored in plans if stored.owner == owner]
+        return list(plans)
@@ -1,17 +1,22 @@
 import os
+import logging
 from typing import List
-from celery import Celery
+from celery import Celery, signals
 from datetime import datetime, timedelta
 from models.study_models import StudyResponse, ReminderRequest
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
+from services.tracing import configure_logging, begin_span, finish_span, current_traceparent, start_span
+
+logger = logging.getLogger(__name__)
 
 # Initialize Celery
 celery_app = Celery(
     'study_reminders',
     broker=os.getenv('REDIS_URL', 'redis://localhost:6379/0'),
-    backend=os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+    backend=os.getenv('REDIS_URL', 'redis://localhost:6379/0'),
+    include=['services.generation_tasks']
 )
 
 celery_app.conf.update(
@@ -20,8 +25,39 @@ celery_app.conf.update(
     result_serializer='json',
     timezone='UTC',
     enable_utc=True,
+    # Plan generation runs on its own queue so it can scale on separate workers
+    task_routes={'generate_study_plan': {'queue': 'generation'}},
 )
 
+@signals.setup_logging.connect
+def _setup_logging(**kwargs):
+    # Use the queue-based, trace-stamped logging in workers too
+    configure_logging()
+
+@signals.before_task_publish.connect
+def _inject_trace_context(headers=None, **kwargs):
+    traceparent = current_traceparent()
+    if traceparent and headers is not None:
+        headers['traceparent'] = traceparent
+
+_task_spans = {}
+
+@signals.task_prerun.connect
+def _start_task_span(task_id=None, task=None, **kwargs):
+    _task_spans[task_id] = begin_span(
+        f"celery.{task.name}",
+        traceparent=getattr(task.request, 'traceparent', None),
+        task_id=task_id
+    )
+
+@signals.task_postrun.connect
+def _finish_task_span(task_id=None, state=None, **kwargs):
+    started = _task_spans.pop(task_id, None)
+    if started:
+        span, token = started
+        span.set_attribute("state", state)
+        finish_span(span, token)
+
 class ReminderService:
     def __init__(self):
         self.smtp_server = os.getenv('SMTP_SERVER', 'smtp.gmail.com')
@@ -34,12 +70,18 @@ class ReminderService:
         """Setup daily study reminders for the user."""
         
         if not self.smtp_username or not self.smtp_password:
-            print("SMTP credentials not configured, skipping email reminders")
+            logger.info("SMTP credentials not configured, skipping email reminders")
             return "reminder_disabled"
         
         # Schedule daily reminders
         reminder_id = f"study_reminder_{email}_{datetime.now().timestamp()}"
         
+        with start_span("reminders.schedule", days=study_data.totalDays):
+            self._schedule_daily_reminders(email, study_data)
+        
+        return reminder_id
+
+    def _schedule_daily_reminders(self, email: str, study_data: StudyResponse):
         for day_index in range(study_data.totalDays):
             # Schedule reminder for 8 AM each day
             reminder_date = datetime.now() + timedelta(days=day_index)
@@ -54,8 +96,6 @@ class ReminderService:
                 args=[email, study_data.subject, day_index + 1, study_data.timetable[day_index]],
                 eta=reminder_datetime
             )
-        
-        return reminder_id
 
 @celery_app.task
 def send_daily_reminder(email: str, subject: str, day_number: int, day_plan: dict):
@@ -64,7 +104,7 @@ def send_daily_reminder(email: str, subject: str, day_number: int, day_plan: dic
     service = ReminderService()
     
     if not service.smtp_username or not service.smtp_password:
-        print(f"SMTP not configured, skipping reminder for {email}")
+        logger.info("SMTP not configured, skipping reminder for %s", email)
         return
     
     try:
@@ -128,10 +168,10 @@ def send_daily_reminder(email: str, subject: str, day_number: int, day_plan: dic
             server.login(service.smtp_username, service.smtp_password)
             server.send_message(msg)
         
-        print(f"Daily reminder sent to {email} for day {day_number}")
+        logger.info("Daily reminder sent to %s for day %s", email, day_number)
         
     except Exception as e:
-        print(f"Failed to send reminder to {email}: {e}")
+        logger.exception("Failed to send reminder to %s: %s", email, e)
 
 @celery_app.task
 def send_completion_celebration(email: str, subject: str):
@@ -175,7 +215,7 @@ def send_completion_celebration(email: str, subject: str):
             server.login(service.smtp_username, service.smtp_password)
             server.send_message(msg)
             
-        print(f"Completion celebration sent to {email}")
+        logger.info("Completion celebration sent to %s", email)
         
     except Exception as e:
-        print(f"Failed to send completion email to {email}: {e}")
\ No newline at end of file
+        logger.exception("Failed to send completion email to %s: %s", email, e)
\ No newline at end of file
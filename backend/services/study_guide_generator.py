@@ -1,37 +1,50 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Callable, Tuple
 from models.study_models import StudyRequest, StudyResponse, Topic, StudySession, DayPlan
 from services.openai_service import OpenAIService
+from services.deadline import Deadline
+from services.tracing import start_span
 import math
 
 class StudyGuideGenerator:
     def __init__(self, openai_service: OpenAIService):
         self.openai_service = openai_service
 
-    async def generate_complete_plan(self, request: StudyRequest) -> StudyResponse:
-        """Generate a complete study plan with topics and timetable."""
+    async def generate_complete_plan(self, request: StudyRequest, deadline: Optional[Deadline] = None,
+                                     on_progress: Optional[Callable[[str], None]] = None) -> StudyResponse:
+        """Generate a complete study plan with topics and timetable.
+        
+        Each LLM stage gets the time left on the deadline and falls back to
+        canned content once it runs out. on_progress is called with the name
+        of each stage as it starts.
+        """
         
         total_hours = request.hoursPerDay * request.totalDays
         
         # Generate topics using OpenAI
+        if on_progress:
+            on_progress("topics")
         topics_data = await self.openai_service.generate_study_topics(
             request.subject, 
-            total_hours
+            total_hours,
+            deadline=deadline
         )
         
         # Convert to Topic objects
         topics = [Topic(**topic_data) for topic_data in topics_data]
         
         # Sort topics by priority (high first) and difficulty
-        topics.sort(key=lambda t: (
-            {'high': 0, 'medium': 1, 'low': 2}[t.priority],
-            {'easy': 0, 'medium': 1, 'hard': 2}[t.difficulty]
-        ))
+        self._sort_topics(topics)
         
         # Generate timetable
-        timetable = self._generate_timetable(topics, request.hoursPerDay, request.totalDays)
+        if on_progress:
+            on_progress("timetable")
+        with start_span("plan.timetable", topics=len(topics), days=request.totalDays):
+            timetable = self._generate_timetable(topics, request.hoursPerDay, request.totalDays)
         
         # Generate overview
-        overview = await self.openai_service.generate_overview(request.subject, topics_data)
+        if on_progress:
+            on_progress("overview")
+        overview = await self.openai_service.generate_overview(request.subject, topics_data, deadline=deadline)
         
         return StudyResponse(
             subject=request.subject,
@@ -43,6 +56,55 @@ class StudyGuideGenerator:
             email=request.email
         )
 
+    async def refine_topic(self, plan: StudyResponse, topic_index: int, action: str,
+                           deadline: Optional[Deadline] = None) -> Tuple[StudyResponse, List[int]]:
+        """Expand or replace one topic and reschedule around it.
+
+        The topic keeps its hour budget, so only the days holding its sessions
+        (or whose sessions move because its priority changed) are rebuilt; all
+        other days are kept as they were. Returns the updated plan and the
+        indexes of the days that changed.
+        """
+        topic = plan.topics[topic_index]
+        other_titles = [other.title for i, other in enumerate(plan.topics) if i != topic_index]
+        
+        refined = await self.openai_service.refine_topic(
+            plan.subject,
+            topic.model_dump(),
+            other_titles,
+            action,
+            deadline=deadline
+        )
+        
+        refined["estimatedHours"] = topic.estimatedHours
+        if action == "expand":
+            refined.update(title=topic.title, priority=topic.priority, difficulty=topic.difficulty)
+        elif refined["title"].strip().lower() in {title.lower() for title in other_titles}:
+            raise ValueError("Replacement topic duplicates an existing topic")
+        
+        topics = list(plan.topics)
+        topics[topic_index] = Topic(**refined)
+        self._sort_topics(topics)
+        
+        with start_span("plan.reschedule", topics=len(topics), days=plan.totalDays):
+            rescheduled = self._generate_timetable(topics, plan.hoursPerDay, plan.totalDays)
+        affected_days = [
+            day_index for day_index, (old, new) in enumerate(zip(plan.timetable, rescheduled))
+            if old != new
+        ]
+        timetable = list(plan.timetable)
+        for day_index in affected_days:
+            timetable[day_index] = rescheduled[day_index]
+        
+        return plan.model_copy(update={"topics": topics, "timetable": timetable}), affected_days
+
+    def _sort_topics(self, topics: List[Topic]):
+        """Order topics by priority (high first), then difficulty (easy first)."""
+        topics.sort(key=lambda t: (
+            {'high': 0, 'medium': 1, 'low': 2}[t.priority],
+            {'easy': 0, 'medium': 1, 'hard': 2}[t.difficulty]
+        ))
+
     def _generate_timetable(self, topics: List[Topic], hours_per_day: float, total_days: int) -> List[DayPlan]:
         """Generate a day-wise timetable distributing topics across available time."""
         
@@ -66,7 +128,7 @@ class StudyGuideGenerator:
                     topic=topic.title,
                     duration=session_duration,
                     priority=topic.priority,
-                    description=f"Study {topic.title}: {topic.summary[:100]}...",
+                    description=self._session_description(topic),
                     suggestedTime=suggested_time,
                     activities=activities
                 )
@@ -130,6 +192,10 @@ class StudyGuideGenerator:
         
         return timetable
 
+    def _session_description(self, topic: Topic) -> str:
+        """Short session description built from the topic summary."""
+        return f"Study {topic.title}: {topic.summary[:100]}..."
+
     def _generate_activities(self, topic: Topic, duration: float) -> List[str]:
         """Generate specific activities for a study session."""
         activities = []
@@ -170,6 +236,10 @@ class StudyGuideGenerator:
         high_priority_count = sum(1 for s in sessions if s.priority == 'high')
         total_hours = sum(s.duration for s in sessions)
         
+        return self._daily_notes_text(day_index, total_days, high_priority_count, total_hours)
+
+    def _daily_notes_text(self, day_index: int, total_days: int, high_priority_count: int, total_hours: float) -> str:
+        """Build the daily notes from the day's position and workload."""
         notes = []
         
         if day_index == 0:
@@ -0,0 +1,119 @@
+import os
+import re
+import json
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+DEFAULT_CORPUS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "topic_corpus.json")
+
+# Longest keyword phrase looked up in the index, in words
+MAX_PHRASE_WORDS = 3
+
+# Words that say nothing about the domain, so they don't count as unmatched
+STOPWORDS = {
+    "a", "an", "and", "the", "of", "for", "to", "in", "on", "with", "from", "into", "my",
+    "intro", "introduction", "basics", "basic", "fundamentals", "beginner", "beginners",
+    "advanced", "intermediate", "course", "class", "exam", "prep", "review", "study", "101",
+    "learn", "learning", "conversational",
+}
+
+
+def _tokenize(text: str) -> List[str]:
+    return re.findall(r"[a-z0-9+#]+", text.lower())
+
+
+class TopicCorpus:
+    """Curated offline topics per subject domain, found through an inverted keyword index.
+
+    The corpus file is read and indexed on first lookup, so it costs nothing
+    at startup. Lookups are a handful of dictionary probes.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.getenv("TOPIC_CORPUS_PATH") or DEFAULT_CORPUS_PATH
+        self._domains: Optional[Dict[str, Dict[str, Any]]] = None
+        self._index: Dict[str, List[Tuple[str, bool]]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._domains is not None
+
+    def _load(self):
+        with self._lock:
+            if self._domains is not None:
+                return
+            with open(self.path, encoding="utf-8") as f:
+                corpus = json.load(f)
+
+            index: Dict[str, List[Tuple[str, bool]]] = {}
+            for domain in corpus["domains"]:
+                broad = set(domain.get("broadKeywords", []))
+                for keyword in domain["keywords"]:
+                    phrase = " ".join(_tokenize(keyword))
+                    index.setdefault(phrase, []).append((domain["id"], keyword in broad))
+            self._index = index
+            self._domains = {domain["id"]: domain for domain in corpus["domains"]}
+
+    def match(self, subject: str) -> Optional[str]:
+        """Return the ID of the domain best matching the subject, or None if there is no confident match.
+
+        Ties are ambiguous ("Python snakes biology"), and so is a domain found
+        only through broad keywords while other words of the subject went
+        unmatched ("Art history", "Derivatives trading", "Spanish guitar").
+        """
+        if self._domains is None:
+            self._load()
+
+        words = _tokenize(subject)
+        scores: Dict[str, int] = {}
+        specific: Dict[str, bool] = {}
+        covered: Dict[str, set] = {}
+        for size in range(1, MAX_PHRASE_WORDS + 1):
+            for start in range(len(words) - size + 1):
+                phrase = " ".join(words[start:start + size])
+                entries = self._index.get(phrase)
+                # Tolerate simple plurals ("derivatives" vs "derivative")
+                if entries is None and size == 1 and phrase.endswith("s"):
+                    entries = self._index.get(phrase[:-1])
+                for domain_id, broad in entries or ():
+                    # Multi-word keywords ("machine learning") outweigh single words
+                    scores[domain_id] = scores.get(domain_id, 0) + size
+                    specific[domain_id] = specific.get(domain_id, False) or not broad
+                    covered.setdefault(domain_id, set()).update(range(start, start + size))
+
+        if not scores:
+            return None
+        ranked = sorted(scores, key=lambda domain_id: -scores[domain_id])
+        best = ranked[0]
+        if len(ranked) > 1 and scores[ranked[1]] == scores[best]:
+            return None
+        if not specific[best]:
+            unmatched = [
+                word for position, word in enumerate(words)
+                if position not in covered[best] and word not in STOPWORDS
+            ]
+            if unmatched:
+                return None
+        return best
+
+    def topics_for(self, subject: str, total_hours: float) -> Optional[List[Dict[str, Any]]]:
+        """Topics for the subject's domain with hours scaled to total_hours, or None if no domain matches."""
+        domain_id = self.match(subject)
+        if domain_id is None:
+            return None
+
+        topics = self._domains[domain_id]["topics"]
+        total_weight = sum(topic["weight"] for topic in topics)
+        return [
+            {
+                "title": topic["title"],
+                "summary": topic["summary"],
+                "priority": topic["priority"],
+                "difficulty": topic["difficulty"],
+                "estimatedHours": round(max(total_hours * topic["weight"] / total_weight, 0.5), 1),
+                "keyPoints": list(topic["keyPoints"]),
+                "resources": list(topic["resources"])
+            }
+            for topic in topics
+        ]
@@ -0,0 +1,257 @@
+import os
+import sys
+import json
+import time
+import queue
+import logging
+import secrets
+import threading
+import logging.handlers
+import httpx
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from typing import Any, Dict, List, Optional, Tuple
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "study-guide-api")
+
+
+class Span:
+    """A timed operation within a trace, identified W3C trace-context style."""
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.error = None
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "service": SERVICE_NAME,
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": (self.end_ns - self.start_ns) / 1e6 if self.end_ns else None,
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+def parse_traceparent(value: Optional[str]) -> Optional[Tuple[str, str]]:
+    """Return (trace_id, parent_span_id) from a W3C traceparent header, if valid."""
+    parts = (value or "").strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        int(parts[1], 16), int(parts[2], 16)
+    except ValueError:
+        return None
+    return parts[1], parts[2]
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def current_traceparent() -> Optional[str]:
+    span = _current_span.get()
+    return span.traceparent if span else None
+
+
+def begin_span(name: str, traceparent: Optional[str] = None, **attributes) -> Tuple[Span, Token]:
+    """Start a span as the current one; pair with finish_span.
+
+    The parent is the span in the current context, or the remote span named by
+    traceparent; otherwise a new trace begins.
+    """
+    parent = _current_span.get()
+    remote = parse_traceparent(traceparent)
+    if remote:
+        trace_id, parent_id = remote
+    elif parent:
+        trace_id, parent_id = parent.trace_id, parent.span_id
+    else:
+        trace_id, parent_id = secrets.token_hex(16), None
+
+    span = Span(name, trace_id, parent_id, attributes)
+    return span, _current_span.set(span)
+
+
+def finish_span(span: Span, token: Token, error: Optional[BaseException] = None):
+    span.end_ns = time.time_ns()
+    if error is not None:
+        span.error = f"{type(error).__name__}: {error}"
+    _current_span.reset(token)
+    exporter.export(span)
+
+
+@contextmanager
+def start_span(name: str, traceparent: Optional[str] = None, **attributes):
+    """Run the block inside a span that is exported when the block ends."""
+    span, token = begin_span(name, traceparent, **attributes)
+    try:
+        yield span
+    except BaseException as e:
+        finish_span(span, token, e)
+        raise
+    finish_span(span, token)
+
+
+class SpanExporter:
+    """Ships finished spans from a background thread, never blocking the caller.
+
+    Spans go to TRACE_EXPORT_FILE as JSON lines and/or are POSTed in batches
+    as OTLP/HTTP JSON to TRACE_OTLP_ENDPOINT (e.g. http://collector:4318/v1/traces).
+    With neither configured, spans are only used for log correlation.
+    """
+
+    def __init__(self, max_queue: int = 10000, batch_size: int = 256):
+        self.file_path = os.getenv("TRACE_EXPORT_FILE")
+        self.endpoint = os.getenv("TRACE_OTLP_ENDPOINT")
+        self.batch_size = batch_size
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.file_path or self.endpoint)
+
+    def _ensure_worker(self):
+        # Start lazily, and again after a fork (e.g. Celery prefork workers)
+        if self._pid == os.getpid() and self._thread and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid != os.getpid() or not (self._thread and self._thread.is_alive()):
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+                self._thread.start()
+
+    def export(self, span: Span):
+        if not self.enabled:
+            return
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait(span.to_dict())
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write(batch)
+            except Exception as e:
+                sys.stderr.write(f"Failed to export {len(batch)} spans: {e}\n")
+
+    def _write(self, batch: List[Dict[str, Any]]):
+        if self.file_path:
+            with open(self.file_path, "a") as f:
+                f.writelines(json.dumps(span) + "\n" for span in batch)
+        if self.endpoint:
+            response = httpx.post(self.endpoint, json=otlp_payload(batch), timeout=5)
+            response.raise_for_status()
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def otlp_payload(spans: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Encode exported spans as an OTLP/HTTP JSON ExportTraceServiceRequest."""
+    otlp_spans = []
+    for span in spans:
+        otlp_span = {
+            "traceId": span["trace_id"],
+            "spanId": span["span_id"],
+            "name": span["name"],
+            "startTimeUnixNano": str(span["start_ns"]),
+            "endTimeUnixNano": str(span["end_ns"]),
+            "attributes": [
+                {"key": key, "value": _otlp_value(value)}
+                for key, value in span["attributes"].items() if value is not None
+            ],
+            # STATUS_CODE_ERROR = 2, STATUS_CODE_UNSET = 0
+            "status": {"code": 2, "message": span["error"]} if span["error"] else {"code": 0},
+        }
+        if span["parent_id"]:
+            otlp_span["parentSpanId"] = span["parent_id"]
+        otlp_spans.append(otlp_span)
+
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+            "scopeSpans": [{"scope": {"name": "study-guide.tracing"}, "spans": otlp_spans}],
+        }]
+    }
+
+
+exporter = SpanExporter()
+
+
+class TraceContextFilter(logging.Filter):
+    """Stamp log records with the current trace and span IDs."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        span = _current_span.get()
+        record.trace_id = span.trace_id if span else "-"
+        record.span_id = span.span_id if span else "-"
+        return True
+
+
+_listener = None
+
+
+def configure_logging(level: Optional[str] = None):
+    """Route logging through a queue so handlers never block the event loop.
+
+    Records are stamped with trace context in the calling thread, then written
+    by a QueueListener thread. Safe to call more than once.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    log_queue = queue.Queue(-1)
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(TraceContextFilter())
+
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter(
+        "%(asctime)s %(levelname)s [%(name)s] [trace=%(trace_id)s span=%(span_id)s] %(message)s"
+    ))
+
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(level or os.getenv("LOG_LEVEL", "INFO"))
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
@@ -0,0 +1,180 @@
+import os
+import random
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+_current_request: ContextVar[Optional["RequestUsage"]] = ContextVar("current_request_usage", default=None)
+
+
+def _empty_counts() -> Dict[str, int]:
+    return {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0}
+
+
+def _add(counts: Dict[str, int], prompt_tokens: int, completion_tokens: int):
+    counts["calls"] += 1
+    counts["prompt_tokens"] += prompt_tokens
+    counts["completion_tokens"] += completion_tokens
+
+
+class RequestUsage:
+    """Token usage of a single API request, broken down by generation stage."""
+
+    def __init__(self, subject: str, client: str):
+        self.subject = subject
+        self.client = client
+        self.stages: Dict[str, Dict[str, int]] = {}
+
+    @property
+    def prompt_tokens(self) -> int:
+        return sum(counts["prompt_tokens"] for counts in self.stages.values())
+
+    @property
+    def completion_tokens(self) -> int:
+        return sum(counts["completion_tokens"] for counts in self.stages.values())
+
+    def header_value(self) -> str:
+        return f"prompt={self.prompt_tokens}, completion={self.completion_tokens}"
+
+
+class UsageTracker:
+    """Aggregates LLM token usage per stage, per subject and per client.
+
+    Subjects and clients beyond ``max_keys`` distinct values are folded into
+    an ``(other)`` bucket so the aggregates stay bounded.
+    """
+
+    def __init__(self, max_keys: Optional[int] = None):
+        self.max_keys = max_keys or int(os.getenv("USAGE_MAX_TRACKED_KEYS", "500"))
+        self._lock = threading.Lock()
+        self.totals = _empty_counts()
+        self.by_stage: Dict[str, Dict[str, int]] = {}
+        self.by_subject: Dict[str, Dict[str, int]] = {}
+        self.by_client: Dict[str, Dict[str, int]] = {}
+
+    @contextmanager
+    def track_request(self, subject: str, client: str):
+        """Attribute LLM calls made within the block (and tasks it spawns) to one request."""
+        usage = RequestUsage(subject.strip().lower(), client)
+        token = _current_request.set(usage)
+        try:
+            yield usage
+        finally:
+            _current_request.reset(token)
+
+    def _bucket(self, table: Dict[str, Dict[str, int]], key: str) -> Dict[str, int]:
+        if key not in table and len(table) >= self.max_keys:
+            key = "(other)"
+        return table.setdefault(key, _empty_counts())
+
+    def record(self, stage: str, usage: Any):
+        """Record the usage block of an OpenAI response for the current request."""
+        if usage is None:
+            return
+        prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+        completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+        request = _current_request.get()
+
+        with self._lock:
+            _add(self.totals, prompt_tokens, completion_tokens)
+            _add(self.by_stage.setdefault(stage, _empty_counts()), prompt_tokens, completion_tokens)
+            if request is not None:
+                _add(request.stages.setdefault(stage, _empty_counts()), prompt_tokens, completion_tokens)
+                _add(self._bucket(self.by_subject, request.subject), prompt_tokens, completion_tokens)
+                _add(self._bucket(self.by_client, request.client), prompt_tokens, completion_tokens)
+
+    def merge(self, subject: str, client: str, stages: Dict[str, Dict[str, int]]):
+        """Fold in per-stage usage of a request tracked elsewhere, e.g. a generation job run by a worker."""
+        subject = subject.strip().lower()
+        with self._lock:
+            for stage, counts in stages.items():
+                for table in (self.totals, self.by_stage.setdefault(stage, _empty_counts()),
+                              self._bucket(self.by_subject, subject), self._bucket(self.by_client, client)):
+                    for field in ("calls", "prompt_tokens", "completion_tokens"):
+                        table[field] += counts.get(field, 0)
+
+    def snapshot(self, top: int = 20) -> Dict[str, Any]:
+        def heaviest(table: Dict[str, Dict[str, int]]) -> Dict[str, Dict[str, int]]:
+            ranked = sorted(table.items(), key=lambda item: -(item[1]["prompt_tokens"] + item[1]["completion_tokens"]))
+            return {key: dict(counts) for key, counts in ranked[:top]}
+
+        with self._lock:
+            return {
+                "totals": dict(self.totals),
+                "by_stage": {stage: dict(counts) for stage, counts in self.by_stage.items()},
+                "by_subject": heaviest(self.by_subject),
+                "by_client": heaviest(self.by_client),
+            }
+
+
+class PromptVariantSelector:
+    """Chooses between the verbose and compact topic prompts.
+
+    Each variant's output quality (0-1) and prompt size are tracked as moving
+    averages. In ``auto`` mode the compact prompt is used once both variants
+    have enough samples and its quality is within ``tolerance`` of the verbose
+    one; a small share of traffic keeps exploring the other variant so the
+    choice follows changes in model behaviour.
+    """
+
+    VARIANTS = ("verbose", "compact")
+
+    def __init__(self, mode: Optional[str] = None, min_samples: int = 20,
+                 tolerance: float = 0.02, explore_rate: float = 0.1):
+        self.mode = (mode or os.getenv("PROMPT_VARIANT", "auto")).lower()
+        self.min_samples = min_samples
+        self.tolerance = tolerance
+        self.explore_rate = explore_rate
+        self.stats = {variant: {"samples": 0, "quality": None, "prompt_tokens": None} for variant in self.VARIANTS}
+
+    def choose(self) -> str:
+        if self.mode in self.VARIANTS:
+            return self.mode
+
+        verbose, compact = self.stats["verbose"], self.stats["compact"]
+        if min(verbose["samples"], compact["samples"]) < self.min_samples:
+            preferred = "verbose"
+        elif compact["quality"] >= verbose["quality"] - self.tolerance:
+            preferred = "compact"
+        else:
+            preferred = "verbose"
+
+        if random.random() < self.explore_rate:
+            return "compact" if preferred == "verbose" else "verbose"
+        return preferred
+
+    def record(self, variant: str, quality: float, prompt_tokens: Optional[int] = None):
+        stats = self.stats[variant]
+        stats["samples"] += 1
+        stats["quality"] = quality if stats["quality"] is None else 0.9 * stats["quality"] + 0.1 * quality
+        if prompt_tokens:
+            previous = stats["prompt_tokens"]
+            stats["prompt_tokens"] = prompt_tokens if previous is None else 0.9 * previous + 0.1 * prompt_tokens
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"mode": self.mode, "variants": {variant: dict(stats) for variant, stats in self.stats.items()}}
+
+
+def score_topics(topics: Any, total_hours: float, required_fields: List[str]) -> float:
+    """Score parsed topic output between 0 and 1 on structure and hour budget."""
+    if not isinstance(topics, list) or not topics:
+        return 0.0
+
+    well_formed = [
+        topic for topic in topics
+        if isinstance(topic, dict) and all(field in topic for field in required_fields)
+    ]
+    checks = [
+        len(topics) >= 5,
+        len(well_formed) == len(topics),
+        all(topic.get("priority") in ("high", "medium", "low") for topic in well_formed),
+        all(topic.get("difficulty") in ("easy", "medium", "hard") for topic in well_formed),
+        all(topic.get("keyPoints") for topic in well_formed),
+    ]
+    try:
+        estimated = sum(float(topic.get("estimatedHours", 0)) for topic in well_formed)
+        checks.append(total_hours > 0 and abs(estimated - total_hours) <= 0.25 * total_hours)
+    except (TypeError, ValueError):
+        checks.append(False)
+    return sum(checks) / len(checks)
@@ -0,0 +1,61 @@
+import os
+import sys
+import asyncio
+import pytest
+
+# Add the backend directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.admission_control import AdmissionController, AdmissionRejected
+
+
+def test_sheds_when_queue_is_full():
+    """Test requests beyond the in-flight limit and queue depth are rejected."""
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, max_queue=1, max_queue_wait=1)
+        await controller.acquire()
+        queued = asyncio.create_task(controller.acquire())
+        await asyncio.sleep(0)
+
+        with pytest.raises(AdmissionRejected) as rejected:
+            await controller.acquire()
+        assert rejected.value.retry_after >= 1
+
+        controller.release()
+        await queued
+        assert controller.stats()["in_flight"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_sheds_on_queue_timeout():
+    """Test a queued request is shed once it waits longer than the limit."""
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, max_queue=4, max_queue_wait=0.01)
+        await controller.acquire()
+
+        with pytest.raises(AdmissionRejected):
+            await controller.acquire()
+        assert controller.stats()["queued"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_cheap_requests_jump_and_displace_cold_ones():
+    """Test cheap requests are admitted first and displace cold waiters when full."""
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, max_queue=1, max_queue_wait=1, prioritize_cheap=True)
+        await controller.acquire()
+        cold = asyncio.create_task(controller.acquire())
+        await asyncio.sleep(0)
+        cheap = asyncio.create_task(controller.acquire(cheap=True))
+        await asyncio.sleep(0)
+
+        with pytest.raises(AdmissionRejected):
+            await cold
+
+        controller.release()
+        await cheap
+        assert controller.stats()["rejected"] == 1
+
+    asyncio.run(scenario())
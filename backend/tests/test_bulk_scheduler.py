@@ -0,0 +1,66 @@
+import os
+import sys
+from hypothesis import given, settings, strategies as st
+
+# Add the backend directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.study_models import Topic
+from services.study_guide_generator import StudyGuideGenerator
+from services.bulk_scheduler import BulkScheduler
+
+generator = StudyGuideGenerator(openai_service=None)
+scheduler = BulkScheduler(generator)
+
+hours = st.one_of(
+    st.integers(min_value=0, max_value=32).map(lambda quarters: quarters / 4),
+    st.floats(min_value=0, max_value=8, allow_nan=False)
+)
+
+topics = st.lists(
+    st.builds(
+        Topic,
+        title=st.text(min_size=1, max_size=20),
+        summary=st.text(max_size=150),
+        priority=st.sampled_from(['high', 'medium', 'low']),
+        difficulty=st.sampled_from(['easy', 'medium', 'hard']),
+        estimatedHours=hours
+    ),
+    max_size=10
+)
+
+plans = st.lists(
+    st.tuples(
+        topics,
+        st.one_of(
+            st.sampled_from([0.5, 1, 1.5, 2, 2.5, 3, 4]),
+            st.floats(min_value=0.1, max_value=12, allow_nan=False)
+        ),
+        st.integers(min_value=1, max_value=30)
+    ),
+    min_size=1,
+    max_size=20
+)
+
+
+@settings(max_examples=100, deadline=None)
+@given(plans)
+def test_bulk_schedule_matches_scalar_scheduler(plans):
+    """Test the vectorized scheduler reproduces the scalar timetables exactly."""
+    expected = [
+        [day.model_dump() for day in generator._generate_timetable(plan_topics, hpd, days)]
+        for plan_topics, hpd, days in plans
+    ]
+    assert scheduler.schedule(plans) == expected
+
+
+def test_bulk_schedule_splits_sessions_across_days():
+    """Test a session that overflows the day is split along with its activities."""
+    first = Topic(title="Scopes", summary="Scopes", priority="high", difficulty="easy", estimatedHours=2.0)
+    second = Topic(title="Closures", summary="Closures", priority="high", difficulty="medium", estimatedHours=2.0)
+    timetable = scheduler.schedule([([first, second], 2.5, 3)])[0]
+
+    assert [[session["duration"] for session in day["sessions"]] for day in timetable] == [[2.0, 0.5], [1.5], []]
+    activities = generator._generate_activities(second, 2.0)
+    assert timetable[0]["sessions"][1]["activities"] == activities[:2]
+    assert timetable[1]["sessions"][0]["activities"] == activities[2:]
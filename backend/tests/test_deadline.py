@@ -0,0 +1,73 @@
+import os
+import sys
+import json
+import time
+import asyncio
+from types import SimpleNamespace
+
+# Add the backend directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+from models.study_models import StudyRequest
+from services.deadline import Deadline
+from services.openai_service import OpenAIService
+from services.study_guide_generator import StudyGuideGenerator
+
+
+class SlowCompletions:
+    """Stand-in for chat.completions that answers topics quickly and stalls afterwards."""
+
+    def __init__(self, topics, delay):
+        self.topics = topics
+        self.delay = delay
+        self.timeouts = []
+
+    async def create(self, timeout=None, **kwargs):
+        self.timeouts.append(timeout)
+        if len(self.timeouts) > 1:
+            await asyncio.sleep(self.delay)
+        content = json.dumps(self.topics)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+def make_generator(completions):
+    service = OpenAIService()
+    service.client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    return StudyGuideGenerator(service)
+
+
+def test_stages_degrade_when_the_deadline_runs_out():
+    """Test later stages fall back instead of overrunning the request budget."""
+    topics = [
+        {"title": f"Topic {i}", "summary": "Summary", "priority": "high",
+         "difficulty": "easy", "estimatedHours": 1}
+        for i in range(3)
+    ]
+    completions = SlowCompletions(topics, delay=5)
+    generator = make_generator(completions)
+    request = StudyRequest(subject="Chemistry", hoursPerDay=2, totalDays=3)
+
+    started = time.monotonic()
+    plan = asyncio.run(generator.generate_complete_plan(request, deadline=Deadline(1.0)))
+
+    assert time.monotonic() - started < 2
+    assert len(plan.topics) == 5
+    # Topped up from the offline corpus with the 3 hours the LLM topics left uncovered
+    assert {"Atomic Structure and the Periodic Table", "Chemical Bonding and Molecular Structure"} <= {
+        topic.title for topic in plan.topics
+    }
+    assert sum(topic.estimatedHours for topic in plan.topics) == 6
+    assert [topic.title for topic in plan.topics[:3]] == ["Topic 0", "Topic 1", "Topic 2"]
+    assert plan.overview.startswith("This comprehensive study plan for Chemistry")
+    assert all(timeout is not None and timeout <= 1.0 for timeout in completions.timeouts)
+
+
+def test_deadline_header_is_capped_by_server_default():
+    """Test clients can shorten but not extend the server budget."""
+    assert Deadline.from_header("5").timeout == 5
+    assert Deadline.from_header("500").timeout == 30
+    assert Deadline.from_header("soon").timeout == 30
+    assert Deadline.from_header("nan").timeout == 30
+    assert Deadline.from_header("inf").timeout == 30
@@ -0,0 +1,83 @@
+import os
+import sys
+import json
+import asyncio
+
+# Add the backend directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+from services.openai_service import OpenAIService
+
+
+class StandInServer:
+    """Minimal keep-alive HTTP/1.1 server answering like the OpenAI API."""
+
+    def __init__(self, delay: float = 0.02):
+        self.delay = delay
+        self.connections = 0
+        self.requests = 0
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while (line := await reader.readline()) not in (b"\r\n", b""):
+                    name, _, value = line.decode().partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                await reader.readexactly(int(headers.get("content-length", 0)))
+                self.requests += 1
+                await asyncio.sleep(self.delay)
+
+                if b"/models" in request_line:
+                    body = {"object": "list", "data": []}
+                else:
+                    body = {
+                        "id": "chatcmpl-1", "object": "chat.completion", "created": 0, "model": "gpt-3.5-turbo",
+                        "choices": [{"index": 0, "finish_reason": "stop",
+                                     "message": {"role": "assistant", "content": "Overview"}}],
+                        "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15},
+                    }
+                payload = json.dumps(body).encode()
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                    + f"Content-Length: {len(payload)}\r\n\r\n".encode() + payload
+                )
+                await writer.drain()
+        finally:
+            writer.close()
+
+
+def test_connections_are_reused_under_concurrency(monkeypatch):
+    """Test warm-up opens pooled connections that concurrent completions then reuse."""
+    monkeypatch.setenv("OPENAI_MAX_CONNECTIONS", "4")
+    monkeypatch.setenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", "4")
+    stand_in = StandInServer()
+
+    async def scenario():
+        server = await asyncio.start_server(stand_in.handle, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        monkeypatch.setenv("OPENAI_BASE_URL", f"http://127.0.0.1:{port}/v1")
+        service = OpenAIService()
+        try:
+            assert await service.warm_up(4) == 4
+            warmed = service.pool_stats()
+            overviews = await asyncio.gather(*(service.generate_overview("Python", []) for _ in range(40)))
+            return warmed, overviews, service.pool_stats()
+        finally:
+            await service.close()
+            server.close()
+
+    warmed, overviews, stats = asyncio.run(scenario())
+
+    assert overviews == ["Overview"] * 40
+    assert warmed["open_connections"] == 4 and warmed["idle_connections"] == 4
+    # Every completion ran on a connection opened during warm-up
+    assert stand_in.connections == 4
+    assert stats["connections_opened"] == 4 and stats["requests"] == 44
+    assert stats["peak_in_flight"] == 40 and stats["in_flight"] == 0
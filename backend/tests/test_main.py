@@ -3,11 +3,16 @@ from fastapi.testclient import TestClient
 from unittest.mock import AsyncMock, patch
 import os
 import sys
+from types import SimpleNamespace
 
 # Add the backend directory to the path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+import main
 from main import app
+from models.study_models import StudyResponse
+from services.compact_format import COMPACT_MEDIA_TYPE, from_compact
+from services.usage_tracker import UsageTracker
 
 client = TestClient(app)
 
@@ -209,6 +214,208 @@ def test_generate_study_guide_exceeds_daily_hours(mock_generate, sample_study_re
     assert response.status_code == 422
     assert "exceeds daily study hours" in response.json()["detail"]
 
+@patch('services.study_guide_generator.StudyGuideGenerator.generate_complete_plan')
+def test_generate_study_guide_compact_format(mock_generate, sample_study_request, sample_study_response):
+    """Test the compact wire format round-trips to the full response."""
+    plan = StudyResponse(**sample_study_response)
+    mock_generate.return_value = plan
+    
+    response = client.post(
+        "/api/study-guide/generate",
+        json=sample_study_request,
+        headers={"Accept": COMPACT_MEDIA_TYPE}
+    )
+    
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith(COMPACT_MEDIA_TYPE)
+    data = response.json()
+    assert data["format"] == "compact-v1"
+    assert data["timetable"][0]["s"][0][0] == 0
+    assert from_compact(data) == plan
+    
+    response = client.post("/api/study-guide/generate?format=compact", json=sample_study_request)
+    assert response.json()["format"] == "compact-v1"
+
+@patch('services.study_guide_generator.StudyGuideGenerator.generate_complete_plan')
+def test_export_study_plan(mock_generate, sample_study_request, sample_study_response):
+    """Test server-side exports of a stored plan and their ETags."""
+    mock_generate.return_value = StudyResponse(**sample_study_response)
+    plan_id = client.post("/api/study-guide/generate", json=sample_study_request).json()["planId"]
+    
+    response = client.get(f"/api/study-guide/plans/{plan_id}/export/ics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/calendar")
+    assert "DTSTART:" in response.text and "T090000" in response.text
+    
+    etag = response.headers["etag"]
+    response = client.get(f"/api/study-guide/plans/{plan_id}/export/ics", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    
+    response = client.get(f"/api/study-guide/plans/{plan_id}/export/md")
+    assert "## Study Topics" in response.text
+    
+    response = client.get(f"/api/study-guide/plans/{plan_id}/export/pdf")
+    assert response.content.startswith(b"%PDF-1.4")
+    assert response.content.rstrip().endswith(b"%%EOF")
+    
+    assert client.get("/api/study-guide/plans/missing/export/pdf").status_code == 404
+    assert client.head(f"/api/study-guide/plans/{plan_id}/export/pdf").status_code == 200
+    assert client.head("/api/study-guide/plans/missing/export/pdf").status_code == 404
+
+@patch('services.study_guide_generator.StudyGuideGenerator.generate_complete_plan')
+def test_export_non_latin_plan(mock_generate, sample_study_request, sample_study_response):
+    """Test exports of non-Latin plans get an ASCII filename and keep WinAnsi punctuation in PDFs."""
+    plan = StudyResponse(**sample_study_response)
+    topics = [plan.topics[0].model_copy(update={"title": "微积分", "summary": "Limits — the “core” idea’s basis"})]
+    mock_generate.return_value = plan.model_copy(update={"subject": "数学", "topics": topics + plan.topics[1:]})
+    plan_id = client.post("/api/study-guide/generate", json=sample_study_request).json()["planId"]
+    
+    for export_format in ("ics", "md", "pdf"):
+        response = client.get(f"/api/study-guide/plans/{plan_id}/export/{export_format}")
+        assert response.status_code == 200
+        assert response.headers["content-disposition"] == f'attachment; filename="study_plan.{export_format}"'
+    
+    assert "Limits \x97 the \x93core\x94 idea\x92s basis".encode("latin-1") in response.content
+    assert b"???" in response.content
+
+@patch('services.study_guide_generator.StudyGuideGenerator.generate_complete_plan')
+def test_generate_study_guide_idempotency_key(mock_generate, sample_study_request, sample_study_response):
+    """Test retries with the same Idempotency-Key replay the first result."""
+    mock_generate.return_value = StudyResponse(**sample_study_response)
+    headers = {"Idempotency-Key": "retry-test-key"}
+    
+    first = client.post("/api/study-guide/generate", json=sample_study_request, headers=headers)
+    retry = client.post("/api/study-guide/generate", json=sample_study_request, headers=headers)
+    
+    assert first.status_code == retry.status_code == 200
+    assert mock_generate.call_count == 1
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert retry.json()["planId"] == first.json()["planId"]
+    
+    conflict = client.post(
+        "/api/study-guide/generate",
+        json={**sample_study_request, "totalDays": 3},
+        headers=headers
+    )
+    assert conflict.status_code == 422
+
+@patch('services.openai_service.OpenAIService.refine_topic', new_callable=AsyncMock)
+def test_refine_topic_reschedules_affected_days(mock_refine, sample_study_response):
+    """Test expanding one topic only rebuilds the days that hold its sessions."""
+    from main import plan_store, study_guide_generator
+    plan = StudyResponse(**sample_study_response)
+    study_guide_generator._sort_topics(plan.topics)
+    plan.timetable = study_guide_generator._generate_timetable(plan.topics, plan.hoursPerDay, plan.totalDays)
+    stored = plan_store.save(plan)
+    objects_index = [topic.title for topic in plan.topics].index("Objects")
+    mock_refine.return_value = {
+        "title": "Objects", "summary": "Prototypes, classes and property descriptors",
+        "priority": "medium", "difficulty": "medium", "estimatedHours": 5,
+        "keyPoints": ["prototypes", "classes", "getters and setters"], "resources": []
+    }
+    
+    response = client.post(f"/api/study-guide/plans/{stored.plan_id}/topics/{objects_index}", json={"action": "expand"})
+    
+    assert response.status_code == 200
+    assert response.headers["x-affected-days"] == "4,5"
+    body = response.json()
+    assert body["topics"][objects_index]["estimatedHours"] == 2
+    assert body["topics"][objects_index]["keyPoints"][0] == "prototypes"
+    assert body["timetable"][0] == plan.timetable[0].model_dump()
+    assert "Prototypes" in body["timetable"][3]["sessions"][1]["description"]
+    assert plan_store.get(stored.plan_id).plan.topics[objects_index].summary.startswith("Prototypes")
+    
+    assert client.post(f"/api/study-guide/plans/{stored.plan_id}/topics/99", json={"action": "expand"}).status_code == 404
+
+@patch('services.study_guide_generator.StudyGuideGenerator.generate_complete_plan')
+def test_stored_plan_conditional_get_and_compression(mock_generate, sample_study_request, sample_study_response):
+    """Test stored plans revalidate with ETags and are gzip-compressed when accepted."""
+    mock_generate.return_value = StudyResponse(**sample_study_response)
+    plan_id = client.post("/api/study-guide/generate", json=sample_study_request).json()["planId"]
+    
+    response = client.get(f"/api/study-guide/plans/{plan_id}", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.json()["planId"] == plan_id
+    etag = response.headers["etag"]
+    assert etag.endswith('-gzip"')
+    
+    response = client.get(f"/api/study-guide/plans/{plan_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    
+    response = client.get(f"/api/study-guide/plans/{plan_id}", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+    
+    assert response.json()["email"] is None
+    
+    history = client.get("/api/study-guide/history")
+    assert history.json()["history"] == []
+    
+    owner = {"X-Session-Id": "session-a"}
+    own_plan_id = client.post("/api/study-guide/generate", json=sample_study_request, headers=owner).json()["planId"]
+    history = client.get("/api/study-guide/history", headers=owner)
+    assert [entry["planId"] for entry in history.json()["history"]] == [own_plan_id]
+    assert client.get("/api/study-guide/history", headers={"X-Session-Id": "session-b"}).json()["history"] == []
+    response = client.get("/api/study-guide/history", headers={**owner, "If-None-Match": history.headers["etag"]})
+    assert response.status_code == 304
+
+@patch('services.study_guide_generator.StudyGuideGenerator.generate_complete_plan')
+def test_bulk_replan_requires_admin(mock_generate, sample_study_request, sample_study_response, monkeypatch):
+    """Test bulk re-planning is admin-only and reschedules the stored plans."""
+    mock_generate.return_value = StudyResponse(**sample_study_response)
+    plan_id = client.post("/api/study-guide/generate", json=sample_study_request).json()["planId"]
+    body = {"planIds": [plan_id, "missing"], "totalDays": 3}
+    
+    monkeypatch.setenv("ADMIN_TOKEN", "secret")
+    assert client.post("/api/study-guide/bulk-replan", json=body).status_code == 401
+    
+    response = client.post("/api/study-guide/bulk-replan", json=body, headers={"Authorization": "Bearer secret"})
+    assert response.status_code == 200
+    assert response.json() == {"replanned": [plan_id], "missing": ["missing"]}
+    assert client.get(f"/api/study-guide/plans/{plan_id}").json()["totalDays"] == 3
+
+@patch('services.generation_tasks.generation_jobs.exists')
+@patch('services.generation_tasks.generation_jobs.record')
+@patch('services.generation_tasks.generate_study_plan.AsyncResult')
+@patch('services.generation_tasks.generate_study_plan.apply_async')
+def test_generation_job_lifecycle(mock_apply, mock_result, mock_record, mock_exists,
+                                  sample_study_request, sample_study_response):
+    """Test queueing a generation job and polling it to completion."""
+    mock_apply.return_value = SimpleNamespace(id="job-123")
+    mock_exists.side_effect = lambda job_id: job_id == "job-123"
+    
+    response = client.post("/api/study-guide/jobs", json=sample_study_request)
+    assert response.status_code == 202
+    assert response.json()["statusUrl"] == "/api/study-guide/jobs/job-123"
+    mock_record.assert_called_once_with("job-123")
+    
+    # Celery would report an unknown ID as PENDING forever
+    mock_result.return_value = SimpleNamespace(state="PENDING", info=None)
+    assert client.get("/api/study-guide/jobs/unknown-job").status_code == 404
+    
+    mock_result.return_value = SimpleNamespace(state="PROGRESS", info={"stage": "overview"})
+    response = client.get("/api/study-guide/jobs/job-123")
+    assert response.json() == {"jobId": "job-123", "status": "running", "stage": "overview"}
+    
+    # The worker's tokens come back with the plan and are counted once, under the job's client
+    assert mock_apply.call_args.kwargs["args"][1] == "testclient"
+    usage = {"topics": {"calls": 1, "prompt_tokens": 400, "completion_tokens": 250}}
+    result = {"plan": sample_study_response, "client": "testclient", "usage": usage}
+    mock_result.return_value = SimpleNamespace(state="SUCCESS", info=result)
+    with patch.object(main.openai_service, "usage_tracker", UsageTracker()) as tracker:
+        response = client.get("/api/study-guide/jobs/job-123?wait=5")
+        assert response.json()["status"] == "succeeded"
+        assert response.json()["result"]["planId"] == "job-123"
+        assert response.json()["result"]["email"] is None
+        assert client.get("/api/study-guide/jobs/job-123").json()["result"]["email"] is None
+    
+    snapshot = tracker.snapshot()
+    assert snapshot["totals"] == {"calls": 1, "prompt_tokens": 400, "completion_tokens": 250}
+    assert snapshot["by_client"]["testclient"]["prompt_tokens"] == 400
+    assert snapshot["by_subject"]["javascript fundamentals"]["completion_tokens"] == 250
+    assert client.get("/api/study-guide/plans/job-123/export/md").status_code == 200
+
 def test_get_study_history():
     """Test getting study history."""
     response = client.get("/api/study-guide/history")
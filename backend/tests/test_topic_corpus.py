@@ -0,0 +1,56 @@
+import os
+import sys
+
+# Add the backend directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+from services.openai_service import OpenAIService
+from services.topic_corpus import TopicCorpus
+
+
+def test_corpus_loads_lazily_and_matches_domains():
+    """Test the corpus is indexed on first lookup and matches subjects to domains."""
+    corpus = TopicCorpus()
+    assert not corpus.loaded
+
+    assert corpus.match("Organic Chemistry") == "chemistry"
+    assert corpus.loaded
+    assert corpus.match("Intro to Machine Learning with Python") == "machine_learning"
+    assert corpus.match("Derivatives and integrals") == "calculus"
+    assert corpus.match("Underwater basket weaving") is None
+
+
+def test_ambiguous_subjects_get_no_domain():
+    """Test ties and broad keywords next to unmatched words are not trusted."""
+    corpus = TopicCorpus()
+
+    assert corpus.match("Art history") is None
+    assert corpus.match("English literature") is None
+    assert corpus.match("Python snakes biology") is None
+    assert corpus.match("Cell phone repair") is None
+    assert corpus.match("Integration testing in Java") is None
+    assert corpus.match("Derivatives trading") is None
+    assert corpus.match("Spanish guitar") is None
+
+    # Broad keywords still match when nothing else in the subject disagrees
+    assert corpus.match("History") == "history"
+    assert corpus.match("Intro to English grammar") == "languages"
+    assert corpus.match("World history") == "history"
+    assert corpus.match("Learn Spanish") == "languages"
+    assert corpus.match("Integral calculus") == "calculus"
+
+
+def test_fallback_topics_come_from_corpus():
+    """Test LLM fallbacks use real corpus topics scaled to the hour budget."""
+    service = OpenAIService()
+
+    topics = service._get_fallback_topics("JavaScript for beginners", 14)
+    assert topics[0]["title"] == "Variables, Types and Operators"
+    assert len(topics) >= 5
+    assert abs(sum(topic["estimatedHours"] for topic in topics) - 14) <= 0.5
+    assert all(topic["keyPoints"] and topic["resources"] for topic in topics)
+
+    generic = service._get_fallback_topics("Underwater basket weaving", 12)
+    assert generic[0]["title"] == "Introduction to Underwater basket weaving"
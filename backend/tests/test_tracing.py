@@ -0,0 +1,64 @@
+import os
+import sys
+import json
+import time
+
+# Add the backend directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.tracing import SpanExporter, start_span, current_traceparent, parse_traceparent, otlp_payload
+
+
+def test_child_spans_continue_remote_trace():
+    """Test spans nest under the caller's traceparent and restore the context afterwards."""
+    remote = "00-" + "a" * 32 + "-" + "b" * 16 + "-01"
+    with start_span("request", traceparent=remote) as parent:
+        with start_span("llm.topics") as child:
+            assert current_traceparent() == child.traceparent
+        assert current_traceparent() == parent.traceparent
+
+    assert parent.trace_id == "a" * 32 and parent.parent_id == "b" * 16
+    assert child.trace_id == parent.trace_id and child.parent_id == parent.span_id
+    assert current_traceparent() is None
+    assert parse_traceparent("garbage") is None
+
+
+def test_exporter_writes_spans_in_background(tmp_path, monkeypatch):
+    """Test finished spans are written as JSON lines by the exporter thread."""
+    export_file = tmp_path / "spans.jsonl"
+    monkeypatch.setenv("TRACE_EXPORT_FILE", str(export_file))
+    exporter = SpanExporter()
+    monkeypatch.setattr("services.tracing.exporter", exporter)
+
+    try:
+        with start_span("reminders.schedule", days=3):
+            raise ValueError("smtp down")
+    except ValueError:
+        pass
+
+    for _ in range(100):
+        if export_file.exists() and export_file.read_text():
+            break
+        time.sleep(0.01)
+    span = json.loads(export_file.read_text().splitlines()[0])
+    assert span["name"] == "reminders.schedule"
+    assert span["attributes"] == {"days": 3}
+    assert span["error"] == "ValueError: smtp down"
+
+
+def test_otlp_payload_follows_the_otlp_json_encoding():
+    """Test spans are posted as OTLP/HTTP JSON resource and scope spans."""
+    with start_span("request") as parent:
+        with start_span("llm.topics", prompt_tokens=120, model="gpt-3.5-turbo", cached=False) as child:
+            pass
+
+    payload = otlp_payload([child.to_dict(), parent.to_dict()])
+    resource_spans = payload["resourceSpans"][0]
+    assert resource_spans["resource"]["attributes"][0]["key"] == "service.name"
+    span, root = resource_spans["scopeSpans"][0]["spans"]
+    assert span["traceId"] == parent.trace_id and span["parentSpanId"] == parent.span_id
+    assert "parentSpanId" not in root
+    assert span["startTimeUnixNano"] == str(child.start_ns)
+    assert {"key": "prompt_tokens", "value": {"intValue": "120"}} in span["attributes"]
+    assert {"key": "cached", "value": {"boolValue": False}} in span["attributes"]
+    assert span["status"] == {"code": 0}
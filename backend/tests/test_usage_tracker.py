@@ -0,0 +1,102 @@
+import os
+import sys
+import json
+import asyncio
+from types import SimpleNamespace
+
+# Add the backend directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+from services.openai_service import OpenAIService
+from services.usage_tracker import UsageTracker, PromptVariantSelector, score_topics
+
+
+class RecordingCompletions:
+    def __init__(self, content):
+        self.content = content
+        self.calls = []
+
+    async def create(self, **kwargs):
+        self.calls.append(kwargs)
+        usage = SimpleNamespace(prompt_tokens=len(kwargs["messages"][-1]["content"]) // 4, completion_tokens=100)
+        return SimpleNamespace(
+            usage=usage,
+            choices=[SimpleNamespace(message=SimpleNamespace(content=self.content))]
+        )
+
+
+def test_usage_is_recorded_per_stage_subject_and_client():
+    """Test token usage is attributed to the stage, the request and its aggregates."""
+    topics = [
+        {"title": f"Topic {i}", "summary": "Summary", "priority": "high", "difficulty": "easy",
+         "estimatedHours": 2, "keyPoints": ["Point"], "resources": []}
+        for i in range(6)
+    ]
+    service = OpenAIService()
+    service.client = SimpleNamespace(chat=SimpleNamespace(completions=RecordingCompletions(json.dumps(topics))))
+
+    async def scenario():
+        with service.usage_tracker.track_request("Organic Chemistry", "school-42") as usage:
+            await service.generate_study_topics("Organic Chemistry", 12)
+            await service.generate_overview("Organic Chemistry", topics)
+        return usage
+
+    usage = asyncio.run(scenario())
+    snapshot = service.usage_tracker.snapshot()
+
+    assert set(usage.stages) == {"topics", "overview"}
+    assert usage.completion_tokens == 200
+    assert snapshot["by_subject"]["organic chemistry"]["calls"] == 2
+    assert snapshot["by_client"]["school-42"]["prompt_tokens"] == usage.prompt_tokens
+    assert snapshot["by_stage"]["topics"]["calls"] == 1
+
+
+def test_generation_job_returns_worker_usage(monkeypatch):
+    """Test job-mode usage is attributed to the request and returned for the API to merge."""
+    from services import generation_tasks
+
+    tracker = UsageTracker()
+
+    async def generate_complete_plan(request, **kwargs):
+        tracker.record("topics", SimpleNamespace(prompt_tokens=400, completion_tokens=250))
+        return SimpleNamespace(model_dump=lambda mode: {"subject": request.subject})
+
+    generator = SimpleNamespace(openai_service=SimpleNamespace(usage_tracker=tracker),
+                                generate_complete_plan=generate_complete_plan)
+    monkeypatch.setattr(generation_tasks, "_get_generator", lambda: generator)
+
+    request = {"subject": "Organic Chemistry", "totalDays": 7, "hoursPerDay": 2}
+    result = generation_tasks.generate_study_plan.run(request, "client-a")
+
+    assert result["client"] == "client-a"
+    assert result["usage"] == {"topics": {"calls": 1, "prompt_tokens": 400, "completion_tokens": 250}}
+    assert tracker.snapshot()["by_subject"]["organic chemistry"]["calls"] == 1
+
+    api_tracker = UsageTracker()
+    api_tracker.merge("Organic Chemistry", result["client"], result["usage"])
+    assert api_tracker.snapshot()["by_client"]["client-a"] == result["usage"]["topics"]
+
+
+def test_compact_prompt_selected_when_quality_matches():
+    """Test auto mode switches to the compact prompt only at equal quality."""
+    selector = PromptVariantSelector(mode="auto", min_samples=3, explore_rate=0)
+    for _ in range(3):
+        selector.record("verbose", 1.0, 400)
+        selector.record("compact", 0.5, 150)
+    assert selector.choose() == "verbose"
+
+    for _ in range(50):
+        selector.record("compact", 1.0, 150)
+    assert selector.choose() == "compact"
+
+
+def test_score_topics_penalizes_malformed_output():
+    """Test the quality score drops for short or malformed topic lists."""
+    topic = {"title": "T", "summary": "S", "priority": "high", "difficulty": "easy",
+             "estimatedHours": 2, "keyPoints": ["K"]}
+    fields = ["title", "summary", "priority", "difficulty", "estimatedHours"]
+    assert score_topics([topic] * 5, 10, fields) == 1.0
+    assert score_topics([topic] * 2, 10, fields) < 1.0
+    assert score_topics("not a list", 10, fields) == 0.0
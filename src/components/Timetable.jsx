@@ -1,12 +1,16 @@
 import React from 'react'
 import { Calendar, Clock, Download, ArrowLeft, BookOpen } from 'lucide-react'
-import { exportToPDF } from '../services/pdfExport'
+import { exportToPDF, exportToCalendar } from '../services/pdfExport'
 
 const Timetable = ({ data, onViewGuide, onReset }) => {
   const handleExportPDF = () => {
     exportToPDF(data, 'timetable')
   }
 
+  const handleExportCalendar = () => {
+    exportToCalendar(data)
+  }
+
   const getDayName = (dayIndex) => {
     const days = ['Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday']
     const today = new Date()
@@ -55,6 +59,13 @@ const Timetable = ({ data, onViewGuide, onReset }) => {
             <Download className="h-4 w-4 mr-2" />
             Export PDF
           </button>
+          <button
+            onClick={handleExportCalendar}
+            className="flex items-center px-4 py-2 bg-white border border-gray-300 text-gray-700 rounded-lg hover:bg-gray-50"
+          >
+            <Calendar className="h-4 w-4 mr-2" />
+            Add to Calendar
+          </button>
         </div>
       </div>
 
@@ -9,13 +9,89 @@ const api = axios.create({
   },
 })
 
+const COMPACT_MEDIA_TYPE = 'application/vnd.studyguide.compact+json'
+
+// crypto.randomUUID only exists in secure contexts (https or localhost)
+export const randomId = () => {
+  if (typeof crypto !== 'undefined' && typeof crypto.randomUUID === 'function') {
+    return crypto.randomUUID()
+  }
+  const bytes = new Uint8Array(16)
+  if (typeof crypto !== 'undefined' && typeof crypto.getRandomValues === 'function') {
+    crypto.getRandomValues(bytes)
+  } else {
+    for (let i = 0; i < bytes.length; i++) {
+      bytes[i] = Math.floor(Math.random() * 256)
+    }
+  }
+  return Array.from(bytes, (byte) => byte.toString(16).padStart(2, '0')).join('')
+}
+
+// Random per-browser secret; the server only lists history for plans made with it
+const getSessionId = () => {
+  let sessionId = localStorage.getItem('studySessionId')
+  if (!sessionId) {
+    sessionId = randomId()
+    localStorage.setItem('studySessionId', sessionId)
+  }
+  return sessionId
+}
+
+api.interceptors.request.use((config) => {
+  config.headers['X-Session-Id'] = getSessionId()
+  return config
+})
+
+// Expand a compact plan payload (sessions referencing topics and a shared
+// string table) back into the full shape the components expect
+export const expandCompactPlan = (data) => {
+  if (!data || data.format !== 'compact-v1') {
+    return data
+  }
+
+  const { format, strings, topics, timetable, ...rest } = data
+
+  return {
+    ...rest,
+    topics,
+    timetable: timetable.map((day) => ({
+      notes: day.n,
+      sessions: day.s.map(([topicIndex, duration, description, suggestedTime, activities]) => ({
+        topic: topics[topicIndex].title,
+        duration,
+        priority: topics[topicIndex].priority,
+        description: strings[description],
+        suggestedTime: suggestedTime >= 0 ? strings[suggestedTime] : null,
+        activities: activities.map((index) => strings[index])
+      }))
+    }))
+  }
+}
+
 export const generateStudyGuide = async (formData) => {
   try {
-    const response = await api.post('/study-guide/generate', formData)
+    // One key per submission so a retried request replays instead of regenerating
+    const config = {
+      headers: {
+        Accept: `${COMPACT_MEDIA_TYPE}, application/json`,
+        'Idempotency-Key': randomId()
+      }
+    }
+    let response
+    try {
+      response = await api.post('/study-guide/generate', formData, config)
+    } catch (error) {
+      // Retry once on network failures; the server dedupes by Idempotency-Key
+      if (error.response) {
+        throw error
+      }
+      response = await api.post('/study-guide/generate', formData, config)
+    }
+    const plan = expandCompactPlan(response.data)
     
     // Save the generated plan with timestamp
     const planData = {
-      ...response.data,
+      ...plan,
       timestamp: new Date().toISOString(),
       formData
     }
@@ -23,7 +99,7 @@ export const generateStudyGuide = async (formData) => {
     // Store in localStorage for persistence
     localStorage.setItem('lastStudyPlan', JSON.stringify(planData))
     
-    return response.data
+    return plan
   } catch (error) {
     if (error.response?.data?.detail) {
       throw new Error(error.response.data.detail)
@@ -32,6 +108,56 @@ export const generateStudyGuide = async (formData) => {
   }
 }
 
+// Queue generation as a background job; resolves with { jobId, status, statusUrl }
+export const createGenerationJob = async (formData) => {
+  const response = await api.post('/study-guide/jobs', formData)
+  return response.data
+}
+
+// Give up on jobs that outlive the worker's own generation budget by a wide margin
+const GENERATION_JOB_TIMEOUT_MS = 5 * 60 * 1000
+
+// Long-poll a generation job until it finishes, reporting each stage via onProgress
+export const waitForGenerationJob = async (jobId, onProgress, timeoutMs = GENERATION_JOB_TIMEOUT_MS) => {
+  const giveUpAt = Date.now() + timeoutMs
+  while (Date.now() < giveUpAt) {
+    let data
+    try {
+      ({ data } = await api.get(`/study-guide/jobs/${jobId}`, { params: { wait: 10 } }))
+    } catch (error) {
+      if (error.response?.status === 404) {
+        throw new Error('This study guide job no longer exists. Please generate it again.')
+      }
+      throw error
+    }
+    if (data.status === 'succeeded') {
+      return data.result
+    }
+    if (data.status === 'failed') {
+      throw new Error(data.error || 'Failed to generate study guide. Please try again.')
+    }
+    onProgress?.(data)
+  }
+  throw new Error('Study guide generation timed out. Please try again.')
+}
+
+// Expand or replace one topic of a stored plan; resolves with the updated plan
+export const refineTopic = async (planId, topicIndex, action) => {
+  try {
+    const response = await api.post(
+      `/study-guide/plans/${planId}/topics/${topicIndex}`,
+      { action },
+      { headers: { Accept: `${COMPACT_MEDIA_TYPE}, application/json` } }
+    )
+    return expandCompactPlan(response.data)
+  } catch (error) {
+    if (error.response?.data?.detail) {
+      throw new Error(error.response.data.detail)
+    }
+    throw new Error('Failed to update topic. Please try again.')
+  }
+}
+
 export const setupReminders = async (email, studyData) => {
   try {
     const response = await api.post('/reminders/setup', {
@@ -57,4 +183,21 @@ export const getStudyHistory = async () => {
   }
 }
 
+export const getPlanExportUrl = (planId, format, sections = 'both') =>
+  `${API_BASE_URL}/study-guide/plans/${planId}/export/${format}?sections=${sections}`
+
+// Plans only live in the server's in-memory store, so a saved planId may be gone
+// after a restart, an eviction or on another instance
+export const isPlanExportAvailable = async (planId, format, sections = 'both') => {
+  if (!planId) {
+    return false
+  }
+  try {
+    await api.head(`/study-guide/plans/${planId}/export/${format}`, { params: { sections } })
+    return true
+  } catch (error) {
+    return false
+  }
+}
+
 export default api
\ No newline at end of file
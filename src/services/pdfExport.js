@@ -1,7 +1,98 @@
-import jsPDF from 'jspdf'
-import html2canvas from 'html2canvas'
+import { getPlanExportUrl, isPlanExportAvailable } from './api'
+
+// Download a server-rendered export (pdf, md or ics) of a stored plan
+export const downloadPlanExport = (planId, format, type = 'both') => {
+  const link = document.createElement('a')
+  link.href = getPlanExportUrl(planId, format, type)
+  link.rel = 'noopener'
+  document.body.appendChild(link)
+  link.click()
+  link.remove()
+}
+
+const pad = (value) => String(value).padStart(2, '0')
+
+const formatIcsDate = (date) =>
+  `${date.getFullYear()}${pad(date.getMonth() + 1)}${pad(date.getDate())}T${pad(date.getHours())}${pad(date.getMinutes())}00`
+
+const escapeIcs = (value) =>
+  value.replace(/\\/g, '\\\\').replace(/;/g, '\\;').replace(/,/g, '\\,').replace(/\n/g, '\\n')
+
+// Start of a suggested slot like '9:00 AM - 11:00 AM (...)', defaulting to 9:00
+const parseStartTime = (suggestedTime) => {
+  const match = /(\d{1,2}):(\d{2})\s*(AM|PM)/i.exec(suggestedTime || '')
+  if (!match) {
+    return [9, 0]
+  }
+  const hour = (parseInt(match[1], 10) % 12) + (match[3].toUpperCase() === 'PM' ? 12 : 0)
+  return [hour, parseInt(match[2], 10)]
+}
+
+// In-browser calendar with the same events as the server export
+const buildCalendar = (data) => {
+  const start = new Date(data.generatedAt || Date.now())
+  const stamp = new Date().toISOString().replace(/[-:]/g, '').replace(/\.\d+Z$/, 'Z')
+  const lines = [
+    'BEGIN:VCALENDAR',
+    'VERSION:2.0',
+    'PRODID:-//Study Guide Generator//Study Plan//EN',
+    'CALSCALE:GREGORIAN',
+    `X-WR-CALNAME:${escapeIcs(data.subject)} Study Plan`
+  ]
+
+  data.timetable.forEach((day, dayIndex) => {
+    const slotCursor = {}
+    day.sessions.forEach((session, sessionIndex) => {
+      const [hour, minute] = parseStartTime(session.suggestedTime)
+      const slot = `${hour}:${minute}`
+      const begin = slotCursor[slot] ||
+        new Date(start.getFullYear(), start.getMonth(), start.getDate() + dayIndex, hour, minute)
+      const minutes = Math.round(session.duration * 60)
+      slotCursor[slot] = new Date(begin.getTime() + minutes * 60 * 1000)
+
+      const description = [session.description, ...(session.activities || []).map((activity) => `- ${activity}`)].join('\n')
+      lines.push(
+        'BEGIN:VEVENT',
+        `UID:${start.getTime()}-${dayIndex + 1}-${sessionIndex + 1}@study-guide`,
+        `DTSTAMP:${stamp}`,
+        `DTSTART:${formatIcsDate(begin)}`,
+        `DURATION:PT${Math.floor(minutes / 60)}H${minutes % 60}M`,
+        `SUMMARY:${escapeIcs(`${data.subject}: ${session.topic}`)}`,
+        `DESCRIPTION:${escapeIcs(description)}`,
+        'END:VEVENT'
+      )
+    })
+  })
+
+  lines.push('END:VCALENDAR')
+  return lines.join('\r\n') + '\r\n'
+}
+
+export const exportToCalendar = async (data) => {
+  if (await isPlanExportAvailable(data.planId, 'ics', 'timetable')) {
+    downloadPlanExport(data.planId, 'ics', 'timetable')
+    return
+  }
+
+  const blob = new Blob([buildCalendar(data)], { type: 'text/calendar' })
+  const link = document.createElement('a')
+  link.href = URL.createObjectURL(blob)
+  link.download = `${data.subject.replace(/\s+/g, '_').toLowerCase()}_study_plan.ics`
+  document.body.appendChild(link)
+  link.click()
+  link.remove()
+  URL.revokeObjectURL(link.href)
+}
 
 export const exportToPDF = async (data, type = 'both') => {
+  // Plans still stored on the server are rendered (and cached) there
+  if (await isPlanExportAvailable(data.planId, 'pdf', type)) {
+    downloadPlanExport(data.planId, 'pdf', type)
+    return
+  }
+
+  // Only pull jsPDF into the page when falling back to in-browser rendering
+  const { default: jsPDF } = await import('jspdf')
   const pdf = new jsPDF()
   const pageWidth = pdf.internal.pageSize.getWidth()
   const pageHeight = pdf.internal.pageSize.getHeight()
@@ -27,7 +27,7 @@ fi
 if [ -n "$REDIS_URL" ]; then
     echo "✅ Redis configured for reminders"
     # Start Celery worker in background for reminders
-    celery -A services.reminder_service.celery_app worker --loglevel=info &
+    celery -A services.reminder_service.celery_app worker -Q celery,generation --loglevel=info &
     echo "📧 Celery worker started for email reminders"
 else
     echo "⚠️  Redis not configured - email reminders disabled"